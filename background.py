@@ -0,0 +1,62 @@
+import threading
+import time
+
+from tracker import OptimizedOpticalFlowTracker, process_source
+
+
+class ProcessingCancelled(Exception):
+    pass
+
+
+class VideoJob:
+    """Processes one video on a background thread, exposing progress for the UI to poll.
+
+    The worker thread never touches Streamlit; the script reads the plain
+    attributes below at whatever rate it chooses to redraw.
+    """
+
+    def __init__(self, input_path, output_path):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.status = 'pending'
+        self.frames = 0
+        self.total = 0
+        self.fps = 0.0
+        self.error = None
+        self.picked_up = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def progress(self):
+        return min(1.0, self.frames / self.total) if self.total else 0.0
+
+    def is_running(self):
+        return self.status in ('pending', 'running')
+
+    def start(self):
+        self.status = 'running'
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _on_progress(self, frames, total):
+        if self._cancel.is_set():
+            raise ProcessingCancelled()
+        elapsed = time.time() - self._start_time
+        self.frames, self.total = frames, total
+        self.fps = frames / elapsed if elapsed > 0 else 0.0
+
+    def _run(self):
+        self._start_time = time.time()
+        try:
+            tracker = OptimizedOpticalFlowTracker()
+            process_source(tracker, self.input_path, self.output_path, progress=self._on_progress)
+            self.status = 'done'
+        except ProcessingCancelled:
+            self.status = 'cancelled'
+        except Exception as e:
+            self.error = str(e)
+            self.status = 'failed'
@@ -0,0 +1,189 @@
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+
+_tracker = None
+_options = None
+
+
+def find_inputs(source):
+    """Video files in a directory (recursively) or matching a glob pattern, sorted."""
+    if os.path.isdir(source):
+        paths = [os.path.join(root, name) for root, _, names in os.walk(source)
+                 for name in names if name.lower().endswith(VIDEO_EXTENSIONS)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(os.path.abspath(path) for path in paths)
+
+
+def output_path_for(input_path, output_dir):
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    # Short digest of the source directory keeps same-named clips from different folders apart
+    digest = hashlib.sha1(os.path.dirname(input_path).encode()).hexdigest()[:6]
+    return os.path.join(output_dir, f"{stem}_{digest}_tracked.mp4")
+
+
+class Manifest:
+    """Per-file status, timings and outputs for a batch, saved as JSON after every update."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.entries = json.load(f)
+
+    def is_done(self, input_path):
+        entry = self.entries.get(input_path)
+        return entry is not None and entry['status'] == 'done' and os.path.exists(entry['output'])
+
+    def record(self, input_path, **entry):
+        self.entries[input_path] = entry
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def _init_worker(tracker_kwargs, options):
+    # Load the model once per worker process; each file only resets tracking state
+    global _tracker, _options
+    from tracker import build_tracker
+    _tracker = build_tracker(**tracker_kwargs)
+    _options = options
+
+
+def _process_file(job):
+    from tracker import process_source
+    input_path, output_path = job
+    start = time.time()
+    try:
+        _tracker.reset()
+        frames = process_source(_tracker, input_path, output_path, **_options)
+        return input_path, {'status': 'done', 'output': output_path, 'frames': frames,
+                            'seconds': round(time.time() - start, 3), 'pid': os.getpid()}
+    except Exception as e:
+        return input_path, {'status': 'failed', 'output': output_path, 'error': str(e),
+                            'seconds': round(time.time() - start, 3), 'pid': os.getpid()}
+
+
+def _worker_main(tasks, results, tracker_kwargs, options):
+    # Serves files from its own queue until it receives None; a failed start fails each file with the reason
+    error = None
+    try:
+        _init_worker(tracker_kwargs, options)
+    except Exception as e:
+        error = f"worker failed to start: {str(e)}"
+    while True:
+        job = tasks.get()
+        if job is None:
+            break
+        if error is not None:
+            results.put((job[0], {'status': 'failed', 'output': job[1], 'error': error, 'seconds': 0.0, 'pid': os.getpid()}))
+        else:
+            results.put(_process_file(job))
+
+
+def run_batch(source, output_dir, workers=None, manifest_path=None, tracker_kwargs=None, options=None):
+    """Process every video under source with a pool of warm workers, skipping files the manifest marks done.
+
+    A worker that dies mid-file has that file recorded as failed and is replaced, so the batch always finishes.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = Manifest(manifest_path or os.path.join(output_dir, 'manifest.json'))
+
+    inputs = find_inputs(source)
+    jobs = [(path, output_path_for(path, output_dir)) for path in inputs if not manifest.is_done(path)]
+    print(f"Found {len(inputs)} videos, {len(inputs) - len(jobs)} already done, {len(jobs)} to process")
+    if not jobs:
+        return manifest
+
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+    # spawn keeps CUDA and OpenCV state out of forked children
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    # One task queue per worker, so a worker that dies (segfault, OOM kill) can be tied to the file it held
+    tasks = [None] * workers
+    processes = [None] * workers
+    running = {}  # Worker index -> job
+
+    def spawn(index):
+        tasks[index] = context.Queue()
+        processes[index] = context.Process(target=_worker_main, daemon=True,
+                                           args=(tasks[index], results, tracker_kwargs or {}, options or {}))
+        processes[index].start()
+
+    def finish(input_path, entry):
+        manifest.record(input_path, **entry)
+        print(f"[{entry['status']}] {input_path} ({entry['seconds']:.1f}s)")
+
+    pending = list(jobs)
+    try:
+        for index in range(workers):
+            spawn(index)
+        while pending or running:
+            for index in range(workers):
+                if index not in running and pending:
+                    if not processes[index].is_alive():
+                        spawn(index)
+                    running[index] = pending.pop(0)
+                    tasks[index].put(running[index])
+            try:
+                input_path, entry = results.get(timeout=1.0)
+            except queue.Empty:
+                for index, (input_path, output_path) in list(running.items()):
+                    process = processes[index]
+                    if not process.is_alive():
+                        del running[index]
+                        finish(input_path, {'status': 'failed', 'output': output_path,
+                                            'error': f"worker exited with code {process.exitcode}", 'seconds': 0.0,
+                                            'pid': process.pid})
+                        spawn(index)
+                continue
+            for index, job in list(running.items()):
+                if job[0] == input_path:
+                    del running[index]
+            finish(input_path, entry)
+    finally:
+        for index, process in enumerate(processes):
+            if process is not None and process.is_alive():
+                tasks[index].put(None)
+        for process in processes:
+            if process is not None:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+    return manifest
+
+
+def cli(argv=None):
+    from tracker import add_tracker_arguments
+    parser = argparse.ArgumentParser(prog="tracker.py batch", description="Process a directory or glob of videos")
+    parser.add_argument("source", help="Directory to scan or glob pattern of video files")
+    parser.add_argument("--output_dir", default="batch_output", help="Directory for processed videos and the manifest")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument("--manifest", default=None, help="Manifest path (default: <output_dir>/manifest.json)")
+    add_tracker_arguments(parser)
+    args = parser.parse_args(argv)
+
+    tracker_kwargs = {'motion_gate': args.motion_gate, 'tile_size': args.tile_size, 'tile_overlap': args.tile_overlap,
+                      'zones_file': args.zones, 'reid': args.reid, 'fast_inference': args.fast_inference,
+                      'flow_engine': args.flow}
+    options = {'max_frames': args.max_frames, 'encoder': args.encoder, 'preset': args.preset,
+               'frame_cache': args.frame_cache, 'sample_every': args.sample_every, 'sample_fps': args.sample_fps,
+               'time_ranges': args.time_ranges}
+    manifest = run_batch(args.source, args.output_dir, args.workers, args.manifest, tracker_kwargs, options)
+    failed = [path for path, entry in manifest.entries.items() if entry['status'] == 'failed']
+    if failed:
+        print(f"{len(failed)} files failed, see {manifest.path}")
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,131 @@
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'DTRC'
+INDEX_MAGIC = b'DIDX'
+VERSION = 2
+HEADER = struct.Struct('<4sI')
+RECORD = struct.Struct('<qdII')  # frame index, timestamp, detection count, searched region count
+TRAILER = struct.Struct('<qq4s')  # index offset, record count, magic
+INDEX_DTYPE = np.dtype([('frame', '<i8'), ('timestamp', '<f8'), ('offset', '<i8'), ('count', '<u4'), ('regions', '<u4')])
+ROW_WIDTH = 6  # x1, y1, x2, y2, conf, cls as float32
+REGION_WIDTH = 4  # x1, y1, x2, y2 as int32; no regions means the whole frame was searched
+
+
+class DetectionTraceWriter:
+    """Appends per-frame detections to a compact binary trace.
+
+    Records are written as they arrive and an index of frame offsets is
+    appended on close, so a reader can seek straight to any frame. Each
+    record also keeps the regions the detector searched, which decide which
+    tracks count a miss, so replay associates exactly as the recorded run did.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION))
+        self.index = []
+
+    def write(self, frame_index, timestamp, detections, searched=None):
+        rows = np.asarray(detections, dtype=np.float32).reshape(-1, ROW_WIDTH)
+        regions = np.asarray(searched if searched is not None else [], dtype=np.int32).reshape(-1, REGION_WIDTH)
+        offset = self.file.tell()
+        self.file.write(RECORD.pack(frame_index, timestamp, len(rows), len(regions)))
+        self.file.write(rows.tobytes())
+        self.file.write(regions.tobytes())
+        self.index.append((frame_index, timestamp, offset, len(rows), len(regions)))
+
+    def close(self):
+        if self.file.closed:
+            return
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        self.file.write(TRAILER.pack(index_offset, len(self.index), INDEX_MAGIC))
+        self.file.close()
+
+
+class DetectionTraceReader:
+    """Random access to a detection trace by frame index."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a detection trace (or an unsupported version): {path}")
+        self.data = np.memmap(path, dtype=np.uint8, mode='r')
+        self.index = self._read_index()
+        order = np.argsort(self.index['frame'], kind='stable')
+        self.index = self.index[order]
+
+    def _read_index(self):
+        size = len(self.data)
+        if size >= HEADER.size + TRAILER.size:
+            index_offset, count, magic = TRAILER.unpack(self.data[size - TRAILER.size:].tobytes())
+            if magic == INDEX_MAGIC:
+                end = index_offset + count * INDEX_DTYPE.itemsize
+                return np.frombuffer(self.data[index_offset:end].tobytes(), dtype=INDEX_DTYPE)
+        return self._scan()
+
+    def _scan(self):
+        # Trace without an index (writer did not close): rebuild it from the records
+        entries = []
+        offset = HEADER.size
+        size = len(self.data)
+        while offset + RECORD.size <= size:
+            frame_index, timestamp, count, regions = RECORD.unpack(self.data[offset:offset + RECORD.size].tobytes())
+            end = offset + RECORD.size + (count * ROW_WIDTH + regions * REGION_WIDTH) * 4
+            if end > size:
+                break
+            entries.append((frame_index, timestamp, offset, count, regions))
+            offset = end
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _find(self, frame_index):
+        i = np.searchsorted(self.index['frame'], frame_index)
+        if i < len(self.index) and self.index['frame'][i] == frame_index:
+            return self.index[i]
+        return None
+
+    def has(self, frame_index):
+        return self._find(frame_index) is not None
+
+    def get(self, frame_index):
+        """(detections, searched) recorded for frame_index, or None if nothing was recorded.
+
+        detections is an (N, 6) float32 array; searched is a list of (x1, y1, x2, y2)
+        regions, or None when the whole frame was searched.
+        """
+        entry = self._find(frame_index)
+        if entry is None:
+            return None
+        start = int(entry['offset']) + RECORD.size
+        count = int(entry['count'])
+        detections = np.frombuffer(self.data, dtype=np.float32, count=count * ROW_WIDTH, offset=start).reshape(count, ROW_WIDTH)
+        searched = None
+        if entry['regions']:
+            regions = np.frombuffer(self.data, dtype=np.int32, count=int(entry['regions']) * REGION_WIDTH,
+                                    offset=start + count * ROW_WIDTH * 4).reshape(-1, REGION_WIDTH)
+            searched = [tuple(int(v) for v in region) for region in regions]
+        return detections, searched
+
+    def timestamp(self, frame_index):
+        entry = self._find(frame_index)
+        return None if entry is None else float(entry['timestamp'])
+
+
+def open_trace(path, mode):
+    if mode == 'record':
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return DetectionTraceWriter(path)
+    if mode == 'replay':
+        return DetectionTraceReader(path)
+    raise ValueError(f"Unknown trace mode: {mode}")
@@ -0,0 +1,54 @@
+import numpy as np
+import torch
+import torchvision
+
+
+class DirectDetector:
+    """Low-overhead YOLOv8 inference on frames that are already resized to the model input size.
+
+    Bypasses the ultralytics predictor: the frame is copied into a
+    preallocated input tensor and normalised in place, the raw network runs
+    under inference_mode, and boxes go through a single batched NMS call.
+    Returns a plain (N, 6) float32 array of x1, y1, x2, y2, conf, cls.
+    """
+
+    def __init__(self, yolo, device, input_size=(640, 640), conf=0.3, iou=0.5, max_det=300):
+        # The module is shared with the high-level predictor (used for crops and tiles), so it stays in fp32
+        self.model = yolo.model.to(device).eval()
+        if hasattr(self.model, 'fuse'):
+            self.model = self.model.fuse(verbose=False)
+        self.device = device
+        self.input_size = input_size
+        self.conf = conf
+        self.iou = iou
+        self.max_det = max_det
+        width, height = input_size
+        self.input = torch.empty((1, 3, height, width), dtype=torch.float32, device=device)
+
+    def supports(self, frame):
+        return frame.shape[1::-1] == tuple(self.input_size)
+
+    def __call__(self, frame):
+        with torch.inference_mode():
+            # HWC BGR uint8 -> CHW RGB, converted and scaled inside the reused buffer
+            source = torch.from_numpy(np.ascontiguousarray(frame)).to(self.device, non_blocking=True)
+            self.input[0].copy_(source.permute(2, 0, 1).flip(0))
+            self.input.mul_(1 / 255.0)
+
+            output = self.model(self.input)
+            preds = output[0] if isinstance(output, (list, tuple)) else output
+            preds = preds[0].transpose(0, 1)  # (anchors, 4 + classes), boxes as cx, cy, w, h
+
+            scores, classes = preds[:, 4:].max(dim=1)
+            keep = scores > self.conf
+            if not keep.any():
+                return np.empty((0, 6), dtype=np.float32)
+            boxes, scores, classes = preds[keep, :4], scores[keep], classes[keep]
+
+            xyxy = torch.empty_like(boxes)
+            xyxy[:, :2] = boxes[:, :2] - boxes[:, 2:] / 2
+            xyxy[:, 2:] = boxes[:, :2] + boxes[:, 2:] / 2
+            kept = torchvision.ops.batched_nms(xyxy, scores, classes, self.iou)[:self.max_det]
+
+            detections = torch.cat([xyxy[kept], scores[kept, None], classes[kept, None].to(xyxy.dtype)], dim=1)
+            return detections.cpu().numpy()
@@ -0,0 +1,81 @@
+import cv2
+import numpy as np
+
+
+class FarnebackFlow:
+    """Farneback dense flow, optionally warm-started from the previous field.
+
+    With warm_start the last flow is passed back in with
+    OPTFLOW_USE_INITIAL_FLOW, so fewer iterations are needed per frame.
+    """
+
+    def __init__(self, warm_start=False, pyr_scale=0.5, levels=3, winsize=15, iterations=3, poly_n=5, poly_sigma=1.1,
+                 warm_iterations=1):
+        self.warm_start = warm_start
+        self.pyr_scale = pyr_scale
+        self.levels = levels
+        self.winsize = winsize
+        self.iterations = iterations
+        self.poly_n = poly_n
+        self.poly_sigma = poly_sigma
+        self.warm_iterations = warm_iterations
+        self.prev_flow = None
+
+    def reset(self):
+        self.prev_flow = None
+
+    def compute(self, prev_gray, frame_gray, frame_step=1):
+        # Sampled frames move further between calls, so add pyramid levels to keep large motion in range
+        levels = self.levels + int(np.log2(frame_step))
+        if self.warm_start and self.prev_flow is not None and self.prev_flow.shape[:2] == frame_gray.shape[:2]:
+            flow = cv2.calcOpticalFlowFarneback(prev_gray, frame_gray, self.prev_flow, self.pyr_scale, levels, self.winsize,
+                                                self.warm_iterations, self.poly_n, self.poly_sigma,
+                                                cv2.OPTFLOW_USE_INITIAL_FLOW)
+        else:
+            flow = cv2.calcOpticalFlowFarneback(prev_gray, frame_gray, None, self.pyr_scale, levels, self.winsize,
+                                                self.iterations, self.poly_n, self.poly_sigma, 0)
+        if self.warm_start:
+            self.prev_flow = flow
+        return flow
+
+
+class DISFlow:
+    """OpenCV DIS optical flow at a fixed preset, reusing one instance and optionally the previous field."""
+
+    PRESETS = {
+        'ultrafast': cv2.DISOPTICAL_FLOW_PRESET_ULTRAFAST,
+        'fast': cv2.DISOPTICAL_FLOW_PRESET_FAST,
+        'medium': cv2.DISOPTICAL_FLOW_PRESET_MEDIUM,
+    }
+
+    def __init__(self, preset='fast', warm_start=True):
+        self.dis = cv2.DISOpticalFlow_create(self.PRESETS[preset])
+        self.warm_start = warm_start
+        self.prev_flow = None
+
+    def reset(self):
+        self.prev_flow = None
+
+    def compute(self, prev_gray, frame_gray, frame_step=1):
+        initial = None
+        if self.warm_start and self.prev_flow is not None and self.prev_flow.shape[:2] == frame_gray.shape[:2]:
+            initial = self.prev_flow
+        flow = self.dis.calc(prev_gray, frame_gray, initial)
+        if self.warm_start:
+            self.prev_flow = flow
+        return flow
+
+
+FLOW_ENGINES = {
+    'farneback': lambda: FarnebackFlow(),
+    'farneback_warm': lambda: FarnebackFlow(warm_start=True),
+    'dis_ultrafast': lambda: DISFlow('ultrafast'),
+    'dis_fast': lambda: DISFlow('fast'),
+    'dis_medium': lambda: DISFlow('medium'),
+}
+
+
+def create_flow_engine(name='farneback'):
+    if name not in FLOW_ENGINES:
+        raise ValueError(f"Unknown flow engine: {name}")
+    return FLOW_ENGINES[name]()
@@ -0,0 +1,221 @@
+import logging
+import multiprocessing
+import queue
+import time
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+UNSUPPORTED_OPTIONS = ('motion_gate', 'tile_size', 'record_detections', 'replay_detections')
+
+
+class SharedFrameRing:
+    """Fixed-size BGR and grayscale frame slots in one shared memory block.
+
+    Processes attach by name and exchange slot indices only; the pixels are
+    written once by the decoder and read in place by every other stage.
+    """
+
+    def __init__(self, slots, frame_size=(640, 640), name=None):
+        width, height = frame_size
+        self.slots = slots
+        self.frame_size = frame_size
+        frame_bytes = slots * height * width * 3
+        gray_bytes = slots * height * width
+        self.owner = name is None
+        if self.owner:
+            self.shm = shared_memory.SharedMemory(create=True, size=frame_bytes + gray_bytes)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.frames = np.ndarray((slots, height, width, 3), dtype=np.uint8, buffer=self.shm.buf)
+        self.gray = np.ndarray((slots, height, width), dtype=np.uint8, buffer=self.shm.buf, offset=frame_bytes)
+
+    def spec(self):
+        return self.slots, self.frame_size, self.name
+
+    @classmethod
+    def attach(cls, spec):
+        slots, frame_size, name = spec
+        return cls(slots, frame_size, name)
+
+    def close(self):
+        # Views must go before the mapping can be closed
+        del self.frames, self.gray
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _decoder(spec, input_source, free_slots, frames_out, detect_out, detectors, detection_interval, max_frames):
+    ring = SharedFrameRing.attach(spec)
+    cap = cv2.VideoCapture(0 if input_source == '0' else input_source)
+    seq = 0
+    try:
+        while max_frames is None or seq < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            slot = free_slots.get()
+            cv2.resize(frame, ring.frame_size, dst=ring.frames[slot])
+            cv2.cvtColor(ring.frames[slot], cv2.COLOR_BGR2GRAY, dst=ring.gray[slot])
+            keyframe = seq % detection_interval == 0
+            if keyframe:
+                detect_out.put((seq, slot))
+            frames_out.put((seq, slot, keyframe))
+            seq += 1
+    finally:
+        cap.release()
+        frames_out.put(None)
+        for _ in range(detectors):
+            detect_out.put(None)
+        ring.close()
+
+
+def _detector(spec, detect_in, results_out, tracker_kwargs):
+    from tracker import build_tracker
+    ring = SharedFrameRing.attach(spec)
+    tracker = None
+    try:
+        tracker = build_tracker(**tracker_kwargs)
+        while True:
+            task = detect_in.get()
+            if task is None:
+                break
+            seq, slot = task
+            try:
+                results_out.put((seq, tracker.detect(ring.frames[slot])))
+            except Exception as e:
+                logger.error(f"Detection failed on frame {seq}: {str(e)}")
+                results_out.put((seq, (np.empty((0, 6), dtype=np.float32), None)))
+    except Exception as e:
+        # Tell the tracking process rather than leave it waiting for this detector's results
+        results_out.put((None, str(e)))
+        raise
+    finally:
+        del tracker
+        ring.close()
+
+
+def _track(spec, frames_in, results_in, free_slots, output_file, fps, tracker_kwargs, sink_kwargs, done):
+    from tracker import build_tracker
+    from video_sink import open_video_sink
+    ring = SharedFrameRing.attach(spec)
+    out = None
+    pending = {}  # Detections that arrived ahead of their frame
+    frame_count = 0
+    error = None
+    try:
+        # Inside the try so a bad zones file or missing encoder is reported, not just an exit code
+        tracker = build_tracker(load_detector=False, **tracker_kwargs)
+        out = open_video_sink(output_file, fps, ring.frame_size, **sink_kwargs)
+        start_time = time.time()
+        while True:
+            message = frames_in.get()
+            if message is None:
+                break
+            seq, slot, keyframe = message
+            detections = searched = None
+            if keyframe:
+                while seq not in pending:
+                    result_seq, result = results_in.get()
+                    if result_seq is None:
+                        raise RuntimeError(f"Detector process failed: {result}")
+                    pending[result_seq] = result
+                detections, searched = pending.pop(seq)
+
+            elapsed_time = time.time() - start_time
+            current_fps = frame_count / elapsed_time if elapsed_time > 0 else 0
+            # The tracker copies the frame before drawing and keeps its own copy of the gray plane for the
+            # next flow step, so the slot can be recycled straight away
+            processed_frame = tracker.process_frame(ring.frames[slot], current_fps, ring.gray[slot].copy(),
+                                                    detections=detections, searched=searched, source_index=seq)
+            free_slots.put(slot)
+            out.write(processed_frame)
+            frame_count += 1
+    except Exception as e:
+        error = str(e)
+    finally:
+        try:
+            if out is not None:
+                out.release()
+        except Exception as e:
+            error = error or str(e)
+        done.put((frame_count, error))
+        ring.close()
+
+
+def run_pipeline(input_source, output_file, detectors=2, slots=16, max_frames=None, detection_interval=5,
+                 tracker_kwargs=None, sink_kwargs=None):
+    """Decode, detect and track in separate processes connected by a shared-memory frame ring.
+
+    Frames never cross a process boundary; queues carry slot indices, and
+    detector processes return only small (N, 6) box arrays. Detectors run on
+    every keyframe, so motion gating, tiling and detection traces are not
+    supported here. Returns the number of frames written.
+    """
+    tracker_kwargs = tracker_kwargs or {}
+    unsupported = sorted(name for name in UNSUPPORTED_OPTIONS if tracker_kwargs.get(name))
+    if unsupported:
+        raise ValueError(f"Not supported by the multi-process pipeline: {', '.join(unsupported)}")
+    cap = cv2.VideoCapture(0 if input_source == '0' else input_source)
+    if not cap.isOpened():
+        raise IOError(f"Could not open input source: {input_source}")
+    fps = int(cap.get(cv2.CAP_PROP_FPS)) or 30
+    cap.release()
+
+    context = multiprocessing.get_context('spawn')
+    ring = SharedFrameRing(slots)
+    free_slots = context.Queue()
+    for slot in range(slots):
+        free_slots.put(slot)
+    frames = context.Queue()
+    detect = context.Queue()
+    results = context.Queue()
+    done = context.Queue()
+
+    # Detectors crop to zones themselves; the tracking process keeps flow, re-id and zone analytics
+    detector_kwargs = {'fast_inference': tracker_kwargs.get('fast_inference', False),
+                       'zones_file': tracker_kwargs.get('zones_file')}
+    track_kwargs = {name: value for name, value in tracker_kwargs.items() if name != 'fast_inference'}
+    spec = ring.spec()
+    processes = [context.Process(target=_decoder, name='decoder', args=(spec, input_source, free_slots, frames, detect,
+                                                                        detectors, detection_interval, max_frames))]
+    processes += [context.Process(target=_detector, name=f'detector-{i}', args=(spec, detect, results, detector_kwargs))
+                  for i in range(detectors)]
+    processes.append(context.Process(target=_track, name='tracker', args=(spec, frames, results, free_slots, output_file,
+                                                                          fps, track_kwargs, sink_kwargs or {}, done)))
+    try:
+        for process in processes:
+            process.start()
+        while True:
+            try:
+                frame_count, error = done.get(timeout=1.0)
+                break
+            except queue.Empty:
+                # Any child dying (bad model path, CUDA OOM, a kill) would otherwise leave the others blocked
+                failed = [process for process in processes if process.exitcode not in (None, 0)]
+                if failed or not processes[-1].is_alive():
+                    try:
+                        # The tracking process may already have reported why
+                        frame_count, error = done.get(timeout=1.0)
+                        break
+                    except queue.Empty:
+                        names = ', '.join(f"{process.name} (exit code {process.exitcode})" for process in failed)
+                        raise RuntimeError(f"Pipeline process exited unexpectedly: {names or 'tracker'}")
+        if error is not None:
+            raise RuntimeError(error)
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            if process.pid is not None:
+                process.join()
+        ring.close()
+    print(f"Video processing complete. Output saved as '{output_file}'")
+    return frame_count
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+
+
+class FrameCache:
+    """Decode-once cache of preprocessed frames and grayscale planes.
+
+    The first run decodes the video, resizes each frame to target_size and
+    stores the BGR frames and their grayscale planes as memory-mapped .npy
+    files. Later runs read zero-copy slices instead of decoding again.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.fps = self.meta['fps']
+        self.length = self.meta['frames']
+        self.frames = np.load(os.path.join(cache_dir, 'frames.npy'), mmap_mode='r')
+        self.gray = np.load(os.path.join(cache_dir, 'gray.npy'), mmap_mode='r')
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        if index < 0 or index >= self.length:
+            raise IndexError(index)
+        return self.frames[index], self.gray[index]
+
+    def __iter__(self):
+        for index in range(self.length):
+            yield self.frames[index], self.gray[index]
+
+    @staticmethod
+    def key(video_path, target_size):
+        stat = os.stat(video_path)
+        source = f"{os.path.abspath(video_path)}:{stat.st_size}:{stat.st_mtime_ns}:{target_size[0]}x{target_size[1]}"
+        return hashlib.sha1(source.encode()).hexdigest()[:16]
+
+    @classmethod
+    def open(cls, video_path, cache_root, target_size=(640, 640)):
+        """Open the cache for video_path, building it on first use."""
+        cache_dir = os.path.join(cache_root, cls.key(video_path, target_size))
+        if not os.path.exists(os.path.join(cache_dir, 'meta.json')):
+            cls.build(video_path, cache_dir, target_size)
+        return cls(cache_dir)
+
+    @staticmethod
+    def build(video_path, cache_dir, target_size=(640, 640)):
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            raise IOError(f"Could not open input source: {video_path}")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        capacity = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        if capacity <= 0:
+            cap.release()
+            raise IOError(f"Frame count unavailable, cannot cache: {video_path}")
+
+        width, height = target_size
+        frames = np.lib.format.open_memmap(os.path.join(cache_dir, 'frames.npy'), mode='w+', dtype=np.uint8,
+                                           shape=(capacity, height, width, 3))
+        gray = np.lib.format.open_memmap(os.path.join(cache_dir, 'gray.npy'), mode='w+', dtype=np.uint8,
+                                         shape=(capacity, height, width))
+        count = 0
+        try:
+            # The container frame count can overestimate; meta.json records how many were decoded
+            while count < capacity:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                cv2.resize(frame, target_size, dst=frames[count])
+                cv2.cvtColor(frames[count], cv2.COLOR_BGR2GRAY, dst=gray[count])
+                count += 1
+        finally:
+            cap.release()
+            frames.flush()
+            gray.flush()
+            del frames, gray
+
+        with open(os.path.join(cache_dir, 'meta.json'), 'w') as f:
+            json.dump({'source': os.path.abspath(video_path), 'fps': fps, 'frames': count,
+                       'size': list(target_size)}, f)
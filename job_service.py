@@ -0,0 +1,376 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 0.5  # Seconds between progress messages from a worker
+UPLOAD_CHUNK = 1 << 20  # Bytes copied per read when spooling an upload to disk
+MAX_UPLOAD_MB = 2048
+MAX_JSON_BYTES = 64 * 1024
+
+
+class JobStore:
+    """SQLite-backed job queue, so queued and finished jobs survive a service restart."""
+
+    COLUMNS = ('id', 'input', 'output', 'status', 'frames', 'total', 'error', 'max_frames', 'created', 'started', 'finished',
+               'upload')
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, input TEXT, output TEXT, status TEXT, frames INTEGER, total INTEGER,
+                error TEXT, max_frames INTEGER, created REAL, started REAL, finished REAL, upload INTEGER DEFAULT 0)""")
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(jobs)")]
+            if 'upload' not in columns:
+                self.db.execute("ALTER TABLE jobs ADD COLUMN upload INTEGER DEFAULT 0")
+            # Jobs interrupted by a restart go back to the queue
+            self.db.execute("UPDATE jobs SET status = 'queued', frames = 0 WHERE status = 'running'")
+
+    def submit(self, input_path, output_path, max_frames=None, upload=False):
+        """Queue a job; upload marks an input spooled by the service, deleted once the job ends."""
+        job_id = uuid.uuid4().hex[:12]
+        with self.lock, self.db:
+            self.db.execute("INSERT INTO jobs (id, input, output, status, frames, total, max_frames, created, upload) "
+                            "VALUES (?, ?, ?, 'queued', 0, 0, ?, ?, ?)",
+                            (job_id, input_path, output_path, max_frames, time.time(), int(upload)))
+        return job_id
+
+    def get(self, job_id):
+        with self.lock:
+            row = self.db.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else None
+
+    def count(self, status):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+    def claim_next(self):
+        """Mark the oldest queued job running and return it, or None."""
+        with self.lock, self.db:
+            row = self.db.execute("SELECT id, input, output, max_frames FROM jobs WHERE status = 'queued' "
+                                  "ORDER BY created LIMIT 1").fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE jobs SET status = 'running', started = ? WHERE id = ?", (time.time(), row[0]))
+        return row
+
+    def update(self, job_id, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        with self.lock, self.db:
+            self.db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def _worker_main(tasks, events, tracker_kwargs, options):
+    # Each worker loads the model once and then serves jobs until it receives None
+    from tracker import build_tracker, process_source
+    tracker = build_tracker(**tracker_kwargs)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        job_id, input_path, output_path, max_frames = task
+        last_sent = 0.0
+
+        def progress(done, total):
+            nonlocal last_sent
+            now = time.time()
+            if now - last_sent >= PROGRESS_INTERVAL:
+                last_sent = now
+                events.put(('progress', job_id, done, total))
+
+        try:
+            tracker.reset()
+            frames = process_source(tracker, input_path, output_path, max_frames=max_frames, progress=progress, **options)
+            events.put(('done', job_id, frames, None))
+        except Exception as e:
+            events.put(('failed', job_id, 0, str(e)))
+
+
+class JobService:
+    """Fixed pool of warm tracker processes fed from the persistent job store.
+
+    Each worker has its own task queue, so the service always knows which job
+    a worker holds; a worker that dies has its job marked failed and is replaced.
+    """
+
+    def __init__(self, store, output_dir, workers=2, max_queued=32, tracker_kwargs=None, options=None, max_frames=None):
+        self.store = store
+        self.max_frames = max_frames  # Default per-job frame limit
+        self.output_dir = output_dir
+        self.workers = workers
+        self.max_queued = max_queued
+        self.tracker_kwargs = tracker_kwargs or {}
+        self.options = options or {}
+        self.assigned = [None] * workers  # Job id each worker is running, None when idle
+        self.busy_lock = threading.Condition()
+        self.submit_lock = threading.Lock()  # Makes the queue-length check and insert atomic
+        self.context = multiprocessing.get_context('spawn')
+        self.events = self.context.Queue()
+        self.tasks = [None] * workers
+        self.processes = [None] * workers
+        self.running = True
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _spawn(self, index):
+        # A fresh queue too: a worker killed inside get() can leave the old queue's lock held
+        self.tasks[index] = self.context.Queue()
+        self.processes[index] = self.context.Process(target=_worker_main, daemon=True,
+                                                     args=(self.tasks[index], self.events, self.tracker_kwargs, self.options))
+        self.processes[index].start()
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+        threading.Thread(target=self._dispatch, daemon=True).start()
+        threading.Thread(target=self._collect, daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        with self.busy_lock:
+            self.busy_lock.notify_all()
+        for tasks in self.tasks:
+            tasks.put(None)
+
+    def full(self):
+        return self.store.count('queued') >= self.max_queued
+
+    def submit(self, input_path, max_frames=None, upload=False):
+        """Queue a job, or return None when the queue is full."""
+        with self.submit_lock:
+            if self.full():
+                return None
+            stem = os.path.splitext(os.path.basename(input_path))[0]
+            job_id = self.store.submit(input_path, None, max_frames, upload)
+            output_path = os.path.join(self.output_dir, f"{stem}_{job_id}.mp4")
+            self.store.update(job_id, output=output_path)
+        with self.busy_lock:
+            self.busy_lock.notify()
+        return job_id
+
+    def _dispatch(self):
+        # Hand out at most one job per worker so queued jobs stay in the store, not in a pipe
+        while self.running:
+            with self.busy_lock:
+                while self.running and None not in self.assigned:
+                    self.busy_lock.wait()
+                if not self.running:
+                    return
+                job = self.store.claim_next()
+                if job is None:
+                    self.busy_lock.wait(timeout=1.0)
+                    continue
+                index = self.assigned.index(None)
+                self.assigned[index] = job[0]
+                tasks = self.tasks[index]
+            tasks.put(job)
+
+    def _collect(self):
+        while self.running:
+            self._check_workers()
+            try:
+                kind, job_id, frames, detail = self.events.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            if kind == 'progress':
+                self.store.update(job_id, frames=frames, total=detail)
+                continue
+            if kind == 'done':
+                self.store.update(job_id, status='done', frames=frames, finished=time.time())
+            else:
+                self.store.update(job_id, status='failed', error=detail, finished=time.time())
+                logger.error(f"Job {job_id} failed: {detail}")
+            self._remove_upload(job_id)
+            self._release(job_id)
+
+    def _remove_upload(self, job_id):
+        # Spooled uploads are only needed while their job runs
+        job = self.store.get(job_id)
+        if job is not None and job['upload']:
+            try:
+                os.remove(job['input'])
+            except FileNotFoundError:
+                pass
+
+    def _release(self, job_id):
+        with self.busy_lock:
+            if job_id in self.assigned:
+                self.assigned[self.assigned.index(job_id)] = None
+                self.busy_lock.notify()
+
+    def _check_workers(self):
+        # A worker killed by a segfault or the OOM killer sends no event: fail its job and replace it
+        for index, process in enumerate(self.processes):
+            if process.is_alive() or not self.running:
+                continue
+            job_id = self.assigned[index]
+            logger.error(f"Worker {index} exited with code {process.exitcode}, starting a replacement")
+            # Replace the worker, under the dispatcher's lock and before freeing its slot, so no job is
+            # ever put on the dead worker's queue
+            with self.busy_lock:
+                self._spawn(index)
+            if job_id is not None:
+                self.store.update(job_id, status='failed', error=f"worker exited with code {process.exitcode}",
+                                  finished=time.time())
+                self._remove_upload(job_id)
+                self._release(job_id)
+
+
+def make_handler(service, upload_dir, max_upload_bytes=MAX_UPLOAD_MB << 20):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            if self.path.rstrip('/') != '/jobs':
+                return self._send_json(404, {'error': 'not found'})
+            if service.full():
+                # Reject before reading the body; the unread body means the connection cannot be reused
+                self.close_connection = True
+                return self._send_json(429, {'error': 'queue full'}, {'Retry-After': '10'})
+            is_json = self.headers.get('Content-Type', '').startswith('application/json')
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                length = -1
+            limit = MAX_JSON_BYTES if is_json else max_upload_bytes
+            if length < 0 or (length == 0 and not is_json):
+                self.close_connection = True
+                return self._send_json(400, {'error': 'missing or invalid Content-Length'})
+            if length > limit:
+                self.close_connection = True
+                return self._send_json(413, {'error': f'body larger than {limit} bytes'})
+            upload = None
+            if is_json:
+                try:
+                    request = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    return self._send_json(400, {'error': 'invalid JSON body'})
+                if not isinstance(request, dict):
+                    return self._send_json(400, {'error': 'JSON body must be an object'})
+                input_path = request.get('input')
+                if not isinstance(input_path, str):
+                    return self._send_json(400, {'error': 'input must be a file path'})
+                max_frames = request.get('max_frames', service.max_frames)
+                if max_frames is not None and (isinstance(max_frames, bool) or not isinstance(max_frames, int)
+                                               or max_frames <= 0):
+                    return self._send_json(400, {'error': 'max_frames must be a positive integer'})
+            else:
+                # Raw video upload, spooled to disk before queueing
+                input_path = upload = os.path.join(upload_dir, f"{uuid.uuid4().hex}.mp4")
+                if not self._spool(input_path, length):
+                    os.remove(input_path)
+                    self.close_connection = True
+                    return self._send_json(400, {'error': 'incomplete upload'})
+                max_frames = service.max_frames
+            if not input_path or not os.path.exists(input_path):
+                return self._send_json(400, {'error': 'input file not found'})
+
+            job_id = service.submit(os.path.abspath(input_path), max_frames, upload=upload is not None)
+            if job_id is None:
+                # Filled up while the body was being read
+                if upload is not None:
+                    os.remove(upload)
+                return self._send_json(429, {'error': 'queue full'}, {'Retry-After': '10'})
+            self._send_json(202, {'id': job_id, 'status': 'queued'})
+
+        def _spool(self, path, length):
+            # Copy the body to disk in fixed-size chunks so an upload never sits in memory whole
+            remaining = length
+            with open(path, 'wb') as f:
+                while remaining > 0:
+                    chunk = self.rfile.read(min(UPLOAD_CHUNK, remaining))
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    remaining -= len(chunk)
+            return remaining == 0
+
+        def do_GET(self):
+            parts = [part for part in self.path.split('/') if part]
+            if len(parts) < 2 or parts[0] != 'jobs':
+                return self._send_json(404, {'error': 'not found'})
+            job = service.store.get(parts[1])
+            if job is None:
+                return self._send_json(404, {'error': 'unknown job'})
+            if len(parts) == 2:
+                job['progress'] = job['frames'] / job['total'] if job['total'] else None
+                return self._send_json(200, job)
+            if parts[2] == 'result':
+                if job['status'] != 'done':
+                    return self._send_json(409, {'error': f"job is {job['status']}"})
+                self.send_response(200)
+                self.send_header('Content-Type', 'video/mp4')
+                self.send_header('Content-Length', str(os.path.getsize(job['output'])))
+                self.end_headers()
+                with open(job['output'], 'rb') as f:
+                    while True:
+                        chunk = f.read(1 << 20)
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                return
+            self._send_json(404, {'error': 'not found'})
+
+        def log_message(self, format, *args):
+            logger.info(format % args)
+
+    return Handler
+
+
+def serve(host='127.0.0.1', port=8765, db_path='jobs.db', output_dir='job_output', workers=2, max_queued=32,
+          tracker_kwargs=None, options=None, max_frames=None, max_upload_mb=MAX_UPLOAD_MB):
+    store = JobStore(db_path)
+    service = JobService(store, output_dir, workers, max_queued, tracker_kwargs, options, max_frames)
+    upload_dir = os.path.join(output_dir, 'uploads')
+    os.makedirs(upload_dir, exist_ok=True)
+    service.start()
+    server = ThreadingHTTPServer((host, port), make_handler(service, upload_dir, max_upload_mb << 20))
+    logger.info(f"Job service listening on http://{host}:{port} with {workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    from tracker import add_tracker_arguments
+    parser = argparse.ArgumentParser(description="Local video tracking job service")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--db", default="jobs.db", help="SQLite file holding the persistent job queue")
+    parser.add_argument("--output_dir", default="job_output", help="Directory for processed videos and uploads")
+    parser.add_argument("--workers", type=int, default=2, help="Number of warm worker processes")
+    parser.add_argument("--max_queued", type=int, default=32, help="Reject submissions once this many jobs are waiting")
+    parser.add_argument("--max_upload_mb", type=int, default=MAX_UPLOAD_MB, help="Reject video uploads larger than this")
+    add_tracker_arguments(parser)
+    args = parser.parse_args()
+
+    tracker_kwargs = {'motion_gate': args.motion_gate, 'tile_size': args.tile_size, 'tile_overlap': args.tile_overlap,
+                      'zones_file': args.zones, 'reid': args.reid, 'fast_inference': args.fast_inference,
+                      'flow_engine': args.flow}
+    options = {'encoder': args.encoder, 'preset': args.preset, 'frame_cache': args.frame_cache,
+               'sample_every': args.sample_every, 'sample_fps': args.sample_fps, 'time_ranges': args.time_ranges}
+    serve(args.host, args.port, args.db, args.output_dir, args.workers, args.max_queued, tracker_kwargs, options,
+          args.max_frames, args.max_upload_mb)
@@ -0,0 +1,81 @@
+import logging
+from collections import deque
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Quality ladder from best to cheapest; the controller moves one rung at a time
+QUALITY_LEVELS = [
+    {'inference_size': 640, 'detection_interval': 5, 'flow_scale': 1.0, 'draw_flow': True},
+    {'inference_size': 640, 'detection_interval': 5, 'flow_scale': 1.0, 'draw_flow': False},
+    {'inference_size': 640, 'detection_interval': 8, 'flow_scale': 0.5, 'draw_flow': False},
+    {'inference_size': 480, 'detection_interval': 10, 'flow_scale': 0.5, 'draw_flow': False},
+    {'inference_size': 320, 'detection_interval': 15, 'flow_scale': 0.25, 'draw_flow': False},
+]
+
+
+class LatencyController:
+    """Adapts tracker quality so capture-to-output latency holds a target.
+
+    Latencies are collected over a sliding window. After each evaluation
+    period the p95 is compared with the target: above it the tracker drops
+    one quality level, and only when it stays below low_ratio * target for
+    several periods in a row does it climb back, so it does not oscillate.
+    """
+
+    def __init__(self, target_ms, window=60, percentile=95, low_ratio=0.6, upgrade_after=3,
+                 min_inference_size=320, max_detection_interval=15, min_flow_scale=0.25):
+        self.target = target_ms / 1000.0
+        self.percentile = percentile
+        self.low_ratio = low_ratio
+        self.upgrade_after = upgrade_after
+        self.window = window
+        self.latencies = deque(maxlen=window)
+        self.levels = [{
+            'inference_size': max(level['inference_size'], min_inference_size),
+            'detection_interval': min(level['detection_interval'], max_detection_interval),
+            'flow_scale': max(level['flow_scale'], min_flow_scale),
+            'draw_flow': level['draw_flow'],
+        } for level in QUALITY_LEVELS]
+        self.level = 0
+        self.frames_since_change = 0
+        self.good_periods = 0
+
+    def apply(self, tracker):
+        for name, value in self.levels[self.level].items():
+            setattr(tracker, name, value)
+
+    def stats(self):
+        if not self.latencies:
+            return {}
+        samples = np.asarray(self.latencies) * 1000.0
+        return {'p50': float(np.percentile(samples, 50)), 'p95': float(np.percentile(samples, 95)),
+                'max': float(samples.max())}
+
+    def update(self, latency, tracker):
+        """Record one frame's latency in seconds and adjust the tracker if an evaluation period has passed."""
+        self.latencies.append(latency)
+        self.frames_since_change += 1
+        if self.frames_since_change < self.window:
+            return
+
+        self.frames_since_change = 0
+        p = float(np.percentile(self.latencies, self.percentile))
+        if p > self.target and self.level < len(self.levels) - 1:
+            self._change(self.level + 1, p, tracker)
+        elif p < self.target * self.low_ratio and self.level > 0:
+            self.good_periods += 1
+            if self.good_periods >= self.upgrade_after:
+                self._change(self.level - 1, p, tracker)
+        else:
+            self.good_periods = 0
+
+    def _change(self, level, p, tracker):
+        direction = "Lowering" if level > self.level else "Raising"
+        self.level = level
+        self.good_periods = 0
+        self.latencies.clear()
+        self.apply(tracker)
+        logger.info(f"{direction} quality to level {level} (p{self.percentile} {p * 1000:.1f} ms, "
+                    f"target {self.target * 1000:.1f} ms): {self.levels[level]}")
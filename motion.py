@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """Cheap change detector run before detection and optical flow.
+
+    Works on a downsampled grayscale frame, either by differencing against the
+    previous frame or with a MOG2 background subtractor, and reports whether
+    anything moved plus the bounding boxes of the changed regions in
+    full-frame coordinates.
+    """
+
+    def __init__(self, scale=0.25, threshold=25, min_area=0.001, method='diff'):
+        self.scale = scale
+        self.threshold = threshold
+        self.min_area = min_area  # Fraction of the frame that must change
+        self.method = method
+        self.prev_small = None
+        self.kernel = np.ones((3, 3), np.uint8)
+        self.subtractor = None
+        if method == 'mog2':
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=self.threshold, detectShadows=False)
+        elif method != 'diff':
+            raise ValueError(f"Unknown motion gate method: {method}")
+
+    def reset(self):
+        self.prev_small = None
+        if self.subtractor is not None:
+            self.subtractor = cv2.createBackgroundSubtractorMOG2(history=200, varThreshold=self.threshold, detectShadows=False)
+
+    def update(self, frame_gray):
+        h, w = frame_gray.shape[:2]
+        small = cv2.resize(frame_gray, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        small = cv2.GaussianBlur(small, (5, 5), 0)
+
+        if self.subtractor is not None:
+            mask = self.subtractor.apply(small)
+            if self.prev_small is None:
+                self.prev_small = small
+                return True, [(0, 0, w, h)]
+        else:
+            if self.prev_small is None or self.prev_small.shape != small.shape:
+                self.prev_small = small
+                return True, [(0, 0, w, h)]
+            diff = cv2.absdiff(small, self.prev_small)
+            self.prev_small = small
+            _, mask = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
+
+        if cv2.countNonZero(mask) < self.min_area * mask.size:
+            return False, []
+
+        mask = cv2.dilate(mask, self.kernel, iterations=2)
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        sx = w / small.shape[1]
+        sy = h / small.shape[0]
+        regions = []
+        for contour in contours:
+            x, y, cw, ch = cv2.boundingRect(contour)
+            regions.append((int(x * sx), int(y * sy), min(w, int((x + cw) * sx)), min(h, int((y + ch) * sy))))
+        return True, regions
+
+
+def union_box(regions):
+    """Smallest box (x1, y1, x2, y2) covering all regions, or None."""
+    if not regions:
+        return None
+    boxes = np.asarray(regions)
+    return int(boxes[:, 0].min()), int(boxes[:, 1].min()), int(boxes[:, 2].max()), int(boxes[:, 3].max())
@@ -0,0 +1,136 @@
+import logging
+import threading
+
+import numpy as np
+
+from video_sink import open_video_sink
+
+logger = logging.getLogger(__name__)
+
+
+class FrameRingBuffer:
+    """Fixed number of preallocated frame slots, overwritten oldest first."""
+
+    def __init__(self, capacity, frame_shape, dtype=np.uint8):
+        self.slots = np.empty((capacity,) + tuple(frame_shape), dtype=dtype)
+        self.capacity = capacity
+        self.seq = 0  # Sequence number of the next frame pushed
+
+    def push(self, frame):
+        np.copyto(self.slots[self.seq % self.capacity], frame)
+        self.seq += 1
+
+    def oldest_seq(self):
+        return max(0, self.seq - self.capacity)
+
+    def get(self, seq):
+        if seq < self.oldest_seq() or seq >= self.seq:
+            raise IndexError(seq)
+        return self.slots[seq % self.capacity]
+
+
+class ClipRecorder:
+    """Bounded-memory recorder for live streams.
+
+    Every frame lands in a ring buffer. trigger() saves a clip covering
+    pre_seconds before the event and post_seconds after it; start()/stop()
+    record until stopped. Frames are handed to an incremental encoder a few
+    at a time as new frames arrive, so memory stays at the ring size however
+    long the session runs, and saving never flushes a large backlog at once.
+    """
+
+    def __init__(self, fps, frame_size, pre_seconds=5.0, post_seconds=5.0, drain_rate=4, encoder='auto'):
+        width, height = frame_size
+        self.fps = fps
+        self.frame_size = frame_size
+        self.pre_frames = int(pre_seconds * fps)
+        self.post_frames = int(post_seconds * fps)
+        # Headroom so the pre-event backlog can drain before its slots are overwritten
+        capacity = max(1, self.pre_frames + self.pre_frames // max(1, drain_rate - 1) + drain_rate)
+        self.ring = FrameRingBuffer(capacity, (height, width, 3))
+        self.drain_rate = drain_rate
+        self.encoder = encoder
+        self.sink = None
+        self.output_path = None
+        self.next_seq = None  # Next ring frame to encode
+        self.end_seq = None  # Stop after this sequence number, None while recording until stop()
+        self.finishers = []
+
+    @property
+    def recording(self):
+        return self.sink is not None
+
+    def push(self, frame):
+        self.ring.push(frame)
+        if self.sink is not None:
+            self._drain()
+
+    def trigger(self, output_path):
+        """Save a clip around now; extends the current clip if one is already being recorded."""
+        if self.sink is not None:
+            if self.end_seq is not None:
+                self.end_seq = max(self.end_seq, self.ring.seq + self.post_frames)
+            return self.output_path
+        self._open(output_path, max(self.ring.oldest_seq(), self.ring.seq - self.pre_frames))
+        self.end_seq = self.ring.seq + self.post_frames
+        return output_path
+
+    def start(self, output_path, include_pre_event=False):
+        """Record from now (or from the buffered pre-event frames) until stop()."""
+        if self.sink is not None:
+            self.stop()
+        start_seq = max(self.ring.oldest_seq(), self.ring.seq - self.pre_frames) if include_pre_event else self.ring.seq
+        self._open(output_path, start_seq)
+        self.end_seq = None
+        return output_path
+
+    def stop(self):
+        """Finish the current recording, encoding whatever is still buffered."""
+        if self.sink is None:
+            return None
+        self.end_seq = self.ring.seq
+        self._drain(limit=None)
+        return self.output_path
+
+    def close(self):
+        self.stop()
+        for finisher in self.finishers:
+            finisher.join()
+        self.finishers = []
+
+    def _open(self, output_path, start_seq):
+        self.sink = open_video_sink(output_path, self.fps, self.frame_size, backend=self.encoder)
+        self.output_path = output_path
+        self.next_seq = start_seq
+
+    def _drain(self, limit=-1):
+        limit = self.drain_rate if limit == -1 else limit
+        stop_seq = self.ring.seq if self.end_seq is None else min(self.ring.seq, self.end_seq)
+        if self.next_seq < self.ring.oldest_seq():
+            logger.warning(f"Recorder fell behind, skipping {self.ring.oldest_seq() - self.next_seq} frames")
+            self.next_seq = self.ring.oldest_seq()
+        written = 0
+        while self.next_seq < stop_seq and (limit is None or written < limit):
+            # Copy out of the slot, which the ring may overwrite before an async encoder reads it
+            self.sink.write(self.ring.get(self.next_seq).copy())
+            self.next_seq += 1
+            written += 1
+        if self.end_seq is not None and self.next_seq >= self.end_seq:
+            self._finish()
+
+    def _finish(self):
+        # Releasing an ffmpeg sink waits for its queue; do that off the caller's thread
+        sink, path = self.sink, self.output_path
+        self.sink = None
+        finisher = threading.Thread(target=self._release, args=(sink, path), daemon=True)
+        finisher.start()
+        self.finishers = [thread for thread in self.finishers if thread.is_alive()] + [finisher]
+
+    @staticmethod
+    def _release(sink, path):
+        try:
+            sink.release()
+        except Exception as e:
+            logger.error(f"Error saving video to {path}: {str(e)}")
+            return
+        logger.info(f"Video saved successfully to {path}")
@@ -0,0 +1,78 @@
+import cv2
+import numpy as np
+
+
+def color_histograms(frame, boxes, bins=(8, 8, 4)):
+    """L2-normalised HSV histograms for every box, from one colour conversion of the frame."""
+    hb, sb, vb = bins
+    hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+    # Quantise once, then each crop is a single bincount over precomputed bin indices
+    codes = ((hsv[..., 0].astype(np.int32) * hb // 180) * sb * vb +
+             (hsv[..., 1].astype(np.int32) * sb // 256) * vb +
+             (hsv[..., 2].astype(np.int32) * vb // 256))
+    h, w = codes.shape
+    size = hb * sb * vb
+    descriptors = np.zeros((len(boxes), size), dtype=np.float32)
+    for i, box in enumerate(np.asarray(boxes, dtype=int).reshape(-1, 4)):
+        x1, y1 = max(0, box[0]), max(0, box[1])
+        x2, y2 = min(w, box[2]), min(h, box[3])
+        if x2 > x1 and y2 > y1:
+            descriptors[i] = np.bincount(codes[y1:y2, x1:x2].ravel(), minlength=size)
+    norms = np.linalg.norm(descriptors, axis=1, keepdims=True)
+    return descriptors / np.maximum(norms, 1e-9)
+
+
+class ReIDGallery:
+    """Fixed-size gallery of lost-track descriptors for re-identification.
+
+    Storage is preallocated to capacity rows. Entries expire after ttl frames,
+    and when the gallery is full the least recently used entry is replaced.
+    Lookups are a single matrix product against all live entries.
+    """
+
+    def __init__(self, capacity=256, dim=256, ttl=300, threshold=0.85):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self.descriptors = np.zeros((capacity, dim), dtype=np.float32)
+        self.ids = np.full(capacity, -1, dtype=int)
+        self.lost_at = np.zeros(capacity, dtype=int)
+        self.last_used = np.zeros(capacity, dtype=int)
+
+    def __len__(self):
+        return int((self.ids >= 0).sum())
+
+    def expire(self, frame_index):
+        self.ids[(self.ids >= 0) & (frame_index - self.lost_at > self.ttl)] = -1
+
+    def add(self, track_ids, descriptors, frame_index):
+        self.expire(frame_index)
+        for track_id, descriptor in zip(track_ids, descriptors):
+            free = np.flatnonzero(self.ids < 0)
+            slot = free[0] if len(free) else int(np.argmin(self.last_used))
+            self.descriptors[slot] = descriptor
+            self.ids[slot] = track_id
+            self.lost_at[slot] = frame_index
+            self.last_used[slot] = frame_index
+
+    def match(self, descriptors, frame_index):
+        """Gallery id per query descriptor, or -1; matched entries leave the gallery."""
+        self.expire(frame_index)
+        matches = np.full(len(descriptors), -1, dtype=int)
+        live = np.flatnonzero(self.ids >= 0)
+        if len(descriptors) == 0 or len(live) == 0:
+            return matches
+
+        similarity = descriptors @ self.descriptors[live].T
+        self.last_used[live[similarity.max(axis=0) >= self.threshold]] = frame_index
+        taken = np.zeros(len(live), dtype=bool)
+        for k in np.argsort(-similarity, axis=None):
+            q, g = np.unravel_index(k, similarity.shape)
+            if similarity[q, g] < self.threshold:
+                break
+            if matches[q] >= 0 or taken[g]:
+                continue
+            matches[q] = self.ids[live[g]]
+            taken[g] = True
+        self.ids[live[taken]] = -1
+        return matches
@@ -0,0 +1,52 @@
+import math
+
+
+def parse_time_ranges(text):
+    """Parse '10-20,65.5-90' (seconds) into [(10.0, 20.0), (65.5, 90.0)]."""
+    ranges = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, end = part.split('-')
+        ranges.append((float(start), float(end)))
+    return ranges
+
+
+class FrameSampler:
+    """Chooses which source frames to decode: every k-th frame, a target fps, and/or time ranges."""
+
+    def __init__(self, source_fps, every=None, target_fps=None, time_ranges=None):
+        step = every or 1
+        if target_fps and source_fps:
+            step = max(step, int(round(source_fps / target_fps)))
+        self.step = max(1, step)
+        self.ranges = None
+        if time_ranges:
+            fps = source_fps or 30
+            self.ranges = []
+            # Merge overlapping ranges so no frame is counted or visited twice
+            for start, end in sorted((int(start * fps), int(math.ceil(end * fps))) for start, end in time_ranges):
+                if self.ranges and start <= self.ranges[-1][1]:
+                    self.ranges[-1] = (self.ranges[-1][0], max(self.ranges[-1][1], end))
+                else:
+                    self.ranges.append((start, end))
+
+    def next_index(self, index):
+        """Smallest frame index >= index that should be processed, or None when nothing is left."""
+        if self.ranges is None:
+            return int(math.ceil(index / self.step)) * self.step
+        for start, end in self.ranges:
+            if index >= end:
+                continue
+            aligned = start + int(math.ceil(max(0, index - start) / self.step)) * self.step
+            if aligned < end:
+                return aligned
+        return None
+
+    def count(self, total_frames):
+        """Number of frames that will be processed out of total_frames."""
+        if self.ranges is None:
+            return int(math.ceil(total_frames / self.step))
+        return sum(int(math.ceil((min(end, total_frames) - start) / self.step))
+                   for start, end in self.ranges if start < total_frames)
@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+import numpy as np
+
+
+class GridIndex:
+    """Uniform-grid spatial hash over track positions.
+
+    Tracks are only re-bucketed when they cross a cell boundary, so keeping
+    the index current costs one integer division per track per update.
+    Candidate pairs are proposed only between a detection and tracks in the
+    cells its box covers plus one ring of neighbours.
+    """
+
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = defaultdict(set)
+        self.cell_of = {}
+
+    def __len__(self):
+        return len(self.cell_of)
+
+    def update(self, ids, points):
+        """Move, insert and drop tracks so the index matches ids/points."""
+        cells = np.floor_divide(np.asarray(points, dtype=np.float32).reshape(-1, 2), self.cell_size).astype(int)
+        seen = set()
+        for track_id, (cx, cy) in zip(ids, cells):
+            track_id = int(track_id)
+            cell = (int(cx), int(cy))
+            seen.add(track_id)
+            old = self.cell_of.get(track_id)
+            if old == cell:
+                continue
+            if old is not None:
+                self._discard(track_id, old)
+            self.cells[cell].add(track_id)
+            self.cell_of[track_id] = cell
+        for track_id in [track_id for track_id in self.cell_of if track_id not in seen]:
+            self.remove(track_id)
+
+    def remove(self, track_id):
+        cell = self.cell_of.pop(track_id, None)
+        if cell is not None:
+            self._discard(track_id, cell)
+
+    def _discard(self, track_id, cell):
+        bucket = self.cells[cell]
+        bucket.discard(track_id)
+        if not bucket:
+            del self.cells[cell]
+
+    def query(self, box, ring=1):
+        """Track ids in the cells covered by box (x1, y1, x2, y2), widened by ring cells."""
+        cs = self.cell_size
+        x1, y1 = int(box[0] // cs) - ring, int(box[1] // cs) - ring
+        x2, y2 = int(box[2] // cs) + ring, int(box[3] // cs) + ring
+        found = []
+        for cx in range(x1, x2 + 1):
+            for cy in range(y1, y2 + 1):
+                bucket = self.cells.get((cx, cy))
+                if bucket:
+                    found.extend(bucket)
+        return found
+
+    def candidate_pairs(self, boxes, ring=1):
+        """Parallel arrays (detection index, track id) of neighbouring pairs."""
+        det_idx, track_ids = [], []
+        for i, box in enumerate(boxes):
+            found = self.query(box, ring)
+            det_idx.extend([i] * len(found))
+            track_ids.extend(found)
+        return np.array(det_idx, dtype=int), np.array(track_ids, dtype=int)
+
+
+def pairwise_iou(boxes_a, boxes_b):
+    """Row-wise IoU between two equally sized (N, 4) xyxy arrays."""
+    w = np.clip(np.minimum(boxes_a[:, 2], boxes_b[:, 2]) - np.maximum(boxes_a[:, 0], boxes_b[:, 0]), 0, None)
+    h = np.clip(np.minimum(boxes_a[:, 3], boxes_b[:, 3]) - np.maximum(boxes_a[:, 1], boxes_b[:, 1]), 0, None)
+    inter = w * h
+    area_a = (boxes_a[:, 2] - boxes_a[:, 0]) * (boxes_a[:, 3] - boxes_a[:, 1])
+    area_b = (boxes_b[:, 2] - boxes_b[:, 0]) * (boxes_b[:, 3] - boxes_b[:, 1])
+    return inter / (area_a + area_b - inter + 1e-9)
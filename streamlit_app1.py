@@ -4,6 +4,9 @@ import tempfile
 import os
 from pathlib import Path
 from tracker import OptimizedOpticalFlowTracker
+from background import VideoJob
+from recorder import ClipRecorder
+from latency import LatencyController
 import time
 import numpy as np
 from datetime import datetime
@@ -13,6 +16,10 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+UI_UPDATE_INTERVAL = 0.25  # Seconds between progress redraws while a job runs
+RECORDING_FPS = 20.0
+LIVE_LATENCY_TARGET_MS = 100.0  # Live streams lower tracking quality to stay under this p95 latency
+
 # Set page configuration
 st.set_page_config(
     page_title="Object Tracking App",
@@ -267,8 +274,8 @@ if 'recording' not in st.session_state:
     st.session_state.recording = False
 if 'camera_video' not in st.session_state:
     st.session_state.camera_video = None
-if 'frames_buffer' not in st.session_state:
-    st.session_state.frames_buffer = []
+if 'job' not in st.session_state:
+    st.session_state.job = None
 
 def ensure_directory_exists(path):
     """Ensure the directory exists for saving files"""
@@ -276,27 +283,6 @@ def ensure_directory_exists(path):
     if directory and not os.path.exists(directory):
         os.makedirs(directory)
 
-def save_video_from_frames(frames, output_path, fps=20.0):
-    """Save video from frames buffer"""
-    if not frames:
-        return None
-    
-    try:
-        ensure_directory_exists(output_path)
-        height, width = frames[0].shape[:2]
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-        
-        for frame in frames:
-            out.write(frame)
-        
-        out.release()
-        logger.info(f"Video saved successfully to {output_path}")
-        return output_path
-    except Exception as e:
-        logger.error(f"Error saving video: {str(e)}")
-        return None
-
 def process_camera_stream():
     """Real-time camera streaming and processing function"""
     try:
@@ -312,6 +298,15 @@ def process_camera_stream():
         
         # Initialize the tracker
         tracker = OptimizedOpticalFlowTracker()
+        controller = LatencyController(LIVE_LATENCY_TARGET_MS)
+        controller.apply(tracker)
+
+        # Recording streams each frame to the encoder through a small fixed ring buffer
+        recorder = None
+        if st.session_state.recording:
+            recorder = ClipRecorder(RECORDING_FPS, (640, 640), pre_seconds=0, post_seconds=0)
+            recording_path = os.path.join(tempfile.gettempdir(), f"camera_recording_{int(time.time() * 1000)}.mp4")
+            st.session_state.camera_video = recorder.start(recording_path)
         
         # Create container and placeholders once, outside the loop
         stream_container = st.container()
@@ -334,6 +329,7 @@ def process_camera_stream():
             if not ret:
                 st.error("Failed to capture frame from camera")
                 break
+            captured_at = time.time()
             
             # Calculate FPS
             fps_counter += 1
@@ -345,12 +341,15 @@ def process_camera_stream():
             
             # Process frame using the tracker
             processed_frame = tracker.process_frame(frame, current_fps)
+            if recorder is not None:
+                recorder.push(processed_frame)
             
             # Convert to RGB for display
             frame_rgb = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
             
             # Update frame in the existing placeholder
             frame_placeholder.image(frame_rgb, channels="RGB", use_column_width=True)
+            controller.update(time.time() - captured_at, tracker)
             
             # Update status with FPS
             status_text = "🎥 Live Processing..."
@@ -374,63 +373,47 @@ def process_camera_stream():
         st.error(f"An error occurred during streaming: {str(e)}")
         if 'cap' in locals() and cap.isOpened():
             cap.release()
+    finally:
+        if 'recorder' in locals() and recorder is not None:
+            recorder.close()
 
 def process_video(input_path):
-    """Process the video using the OptimizedOpticalFlowTracker"""
+    """Start processing the video in a background job for this session"""
     if not os.path.exists(input_path):
         st.error("Input video file not found")
         return None
-        
-    output_path = os.path.join(tempfile.gettempdir(), "processed_output.mp4")
-    tracker = OptimizedOpticalFlowTracker()
-    
-    try:
-        cap = cv2.VideoCapture(input_path)
-        if not cap.isOpened():
-            st.error("Could not open input video file")
-            return None
-            
-        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-        fps = int(cap.get(cv2.CAP_PROP_FPS))
-        
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (640, 640))
-        
-        frame_count = 0
-        start_time = time.time()
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
-                
-            progress = frame_count / total_frames if total_frames > 0 else 0
-            progress_bar.progress(progress)
-            
-            elapsed_time = time.time() - start_time
-            current_fps = frame_count / elapsed_time if elapsed_time > 0 else 0
-            
-            processed_frame = tracker.process_frame(frame, current_fps)
-            out.write(processed_frame)
-            
-            frame_count += 1
-            status_text.text(f"Processing frame {frame_count}... FPS: {current_fps:.2f}")
-        
-        cap.release()
-        out.release()
+
+    output_path = os.path.join(tempfile.gettempdir(), f"processed_output_{int(time.time() * 1000)}.mp4")
+    return VideoJob(input_path, output_path).start()
+
+def show_job_progress(job):
+    """Poll the background job, redrawing progress a few times per second"""
+    progress_bar = st.progress(job.progress)
+    status_text = st.empty()
+    if job.is_running() and st.button("⏹️ Cancel Processing", key="cancel_processing"):
+        job.cancel()
+
+    while job.is_running():
+        progress_bar.progress(job.progress)
+        status_text.text(f"Processing frame {job.frames}... FPS: {job.fps:.2f}")
+        time.sleep(UI_UPDATE_INTERVAL)
+
+    if job.status == 'done':
         progress_bar.progress(1.0)
         status_text.text("Processing complete!")
-        return output_path
-        
-    except Exception as e:
-        logger.error(f"Error processing video: {str(e)}")
-        st.error(f"An error occurred during processing: {str(e)}")
-        return None
+    elif job.status == 'cancelled':
+        status_text.text("Processing cancelled")
+    elif job.status == 'failed':
+        logger.error(f"Error processing video: {job.error}")
+        st.error(f"An error occurred during processing: {job.error}")
+
+def collect_job_result(job):
+    """Pick up a finished job's output on whichever rerun sees it first"""
+    if job.status == 'done' and os.path.exists(job.output_path):
+        st.session_state.processed_video = job.output_path
+        st.session_state.processing_complete = True
+    if not job.is_running():
+        job.picked_up = True
 
 # Main App Layout with Premium Dark Theme
 st.markdown("""
@@ -483,23 +466,39 @@ with col2:
         </div>
     """, unsafe_allow_html=True)
     
+    st.session_state.recording = st.checkbox("⏺️ Record stream", value=st.session_state.recording)
     if st.button("▶️ Start Live Processing", key="start_streaming"):
         process_camera_stream()
 
+    if st.session_state.camera_video and os.path.exists(st.session_state.camera_video):
+        with open(st.session_state.camera_video, 'rb') as f:
+            st.download_button(
+                label="⬇️ Download Recording",
+                data=f.read(),
+                file_name="camera_recording.mp4",
+                mime="video/mp4"
+            )
+
 # Process button
 if st.session_state.input_video and os.path.exists(st.session_state.input_video):
     st.markdown("<div class='section-divider'></div>", unsafe_allow_html=True)
-    if st.button("🚀 Process Video"):
-        with st.spinner(""):
+    job = st.session_state.job
+    if job is None or not job.is_running():
+        if st.button("🚀 Process Video"):
+            st.session_state.processing_complete = False
+            st.session_state.job = process_video(st.session_state.input_video)
+
+    # The job outlives script reruns, so progress and results are picked up on whichever run is current
+    job = st.session_state.job
+    if job is not None and not job.picked_up:
+        if job.is_running():
             st.markdown("""
                 <div class='status-message status-processing'>
                     <span>🔄 Processing video...</span>
                 </div>
             """, unsafe_allow_html=True)
-            output_path = process_video(st.session_state.input_video)
-            if output_path and os.path.exists(output_path):
-                st.session_state.processed_video = output_path
-                st.session_state.processing_complete = True
+        show_job_progress(job)
+        collect_job_result(job)
 
 # Display processed video
 if st.session_state.processing_complete and st.session_state.processed_video:
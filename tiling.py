@@ -0,0 +1,82 @@
+import numpy as np
+
+
+def tile_grid(height, width, tile_size=640, overlap=0.2):
+    """Overlapping (x1, y1, x2, y2) tiles covering a frame, edge tiles shifted inward."""
+    stride = max(1, int(tile_size * (1 - overlap)))
+
+    def starts(length):
+        if length <= tile_size:
+            return [0]
+        positions = list(range(0, length - tile_size, stride))
+        positions.append(length - tile_size)
+        return positions
+
+    return [(x, y, min(x + tile_size, width), min(y + tile_size, height))
+            for y in starts(height) for x in starts(width)]
+
+
+def nms(boxes, scores, iou_threshold=0.5):
+    """Greedy non-maximum suppression, returns indices of kept boxes."""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=int)
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = scores.argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        keep.append(i)
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=int)
+
+
+def merge_tile_detections(tile_detections, tiles, iou_threshold=0.5, ios_threshold=0.6):
+    """Shift per-tile [x1, y1, x2, y2, conf, cls] rows to frame coordinates and merge duplicates across tiles.
+
+    Within a tile boxes are compared by IoU. Across tiles an object cut by a
+    tile edge leaves a thin partial box whose IoU with the full box is low,
+    so those pairs are compared by intersection over the smaller box instead
+    and merged into their union. Boxes of different classes are never merged.
+    """
+    shifted, sources = [], []
+    for i, (detections, (tx, ty, _, _)) in enumerate(zip(tile_detections, tiles)):
+        if len(detections) == 0:
+            continue
+        detections = np.array(detections, dtype=np.float32, copy=True)
+        detections[:, [0, 2]] += tx
+        detections[:, [1, 3]] += ty
+        shifted.append(detections)
+        sources.append(np.full(len(detections), i))
+    if not shifted:
+        return np.empty((0, 6), dtype=np.float32)
+
+    merged = np.concatenate(shifted)
+    sources = np.concatenate(sources)
+    x1, y1, x2, y2 = merged[:, 0], merged[:, 1], merged[:, 2], merged[:, 3]
+    areas = (x2 - x1) * (y2 - y1)
+    order = merged[:, 4].argsort()[::-1]
+    keep = []
+    while order.size > 0:
+        i = order[0]
+        rest = order[1:]
+        w = np.clip(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0, None)
+        h = np.clip(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0, None)
+        inter = w * h
+        iou = inter / (areas[i] + areas[rest] - inter + 1e-9)
+        ios = inter / (np.minimum(areas[i], areas[rest]) + 1e-9)
+        same_class = merged[rest, 5] == merged[i, 5]
+        cross = same_class & (sources[rest] != sources[i]) & (ios > ios_threshold)
+        duplicate = cross | (same_class & (iou > iou_threshold))
+        if cross.any():
+            parts = merged[rest[cross], :4]
+            merged[i, :2] = np.minimum(merged[i, :2], parts[:, :2].min(axis=0))
+            merged[i, 2:4] = np.maximum(merged[i, 2:4], parts[:, 2:4].max(axis=0))
+        keep.append(i)
+        order = rest[~duplicate]
+    return merged[keep]
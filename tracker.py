@@ -4,89 +4,397 @@ from ultralytics import YOLO
 import torch
 import time
 import argparse
+import logging
+import sys
+from motion import MotionGate, union_box
+from tiling import tile_grid, merge_tile_detections
+from zones import ZoneAnalytics, load_zones
+from video_sink import open_video_sink
+from frame_cache import FrameCache
+from spatial_index import GridIndex, pairwise_iou
+from reid import ReIDGallery, color_histograms
+from sampling import FrameSampler, parse_time_ranges
+from flow_engines import FLOW_ENGINES, create_flow_engine
+from detection_trace import open_trace
+from latency import LatencyController
 
 class OptimizedOpticalFlowTracker:
-    def __init__(self, yolo_model='yolov8n.pt'):
+    def __init__(self, yolo_model='yolov8n.pt', motion_gate=None, tile_size=None, tile_overlap=0.2, tile_batch=8, zones=None, reid=False, fast_inference=False, flow_engine='farneback',
+                 record_detections=None, replay_detections=None, load_detector=True):
         self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-        print(f"Using device for YOLO: {self.device}")
-        self.yolo = YOLO(yolo_model)
-        self.yolo.to(self.device)
+        # Replaying a detection trace never runs the detector, so the model is not loaded at all;
+        # load_detector=False is for callers that pass detections to process_frame themselves
+        self.trace_writer = open_trace(record_detections, 'record') if record_detections else None
+        self.trace_reader = open_trace(replay_detections, 'replay') if replay_detections else None
+        self.yolo = None
+        if self.trace_reader is None and load_detector:
+            print(f"Using device for YOLO: {self.device}")
+            self.yolo = YOLO(yolo_model)
+            self.yolo.to(self.device)
+        self.fast_detector = None  # Direct torch path for full 640x640 frames
+        if fast_inference and self.yolo is not None:
+            from fast_inference import DirectDetector
+            self.fast_detector = DirectDetector(self.yolo, self.device)
         
+        self.match_iou = 0.2
+        self.max_misses = 3
+        self.use_reid = reid
+        self.detection_interval = 5
+        self.inference_size = 640  # YOLO input size; the tracking frame stays 640x640
+        self.flow_scale = 1.0  # Optical flow runs on frames scaled by this factor
+        self.draw_flow = True
+        self.class_names = 'object' #self.yolo.names  # Load class names from YOLO
+        self.motion_gate = motion_gate  # Optional MotionGate, skips detection and flow on static frames
+        self.region_fraction = 0.5  # Only crop detection to changed regions smaller than this
+        self.tile_size = tile_size  # Detect on overlapping tiles of the source frame when set
+        self.tile_overlap = tile_overlap
+        self.tile_batch = tile_batch
+        self.zones = ZoneAnalytics(zones) if zones else None  # Restricts detection and flow to zone crops
+        self.flow_engine = create_flow_engine(flow_engine)
+        # One engine per zone crop so warm starts never mix fields of different crops
+        self.zone_flow_engines = [create_flow_engine(flow_engine) for _ in self.zones.bounds] if self.zones else []
+        self.reset()
+
+        #print("Using CPU-based OpenCV for optical flow")
+
+    def reset(self):
+        # Clear per-video state so one loaded model can process several sources
         self.prev_gray = None
-        self.prev_points = None
+        self.prev_points = np.empty((0, 2), dtype=np.float32)
         self.track_id = 0
         self.tracks = {}
+        self.track_ids = np.empty(0, dtype=int)  # Parallel to prev_points
+        self.track_boxes = np.empty((0, 4), dtype=np.float32)
+        self.track_misses = np.empty(0, dtype=int)  # Consecutive keyframes without a matching detection
+        self.grid = GridIndex(cell_size=64)
+        self.reid = ReIDGallery() if self.use_reid else None  # Gallery of lost tracks for re-identification
+        self.track_desc = np.empty((0, self.reid.descriptors.shape[1] if self.reid is not None else 0), dtype=np.float32)
         self.last_detections = None
+        self.searched_regions = None  # Boxes the last detection pass covered, None for the whole frame
         self.frame_count = 0
-        self.detection_interval = 5
-        self.class_names = 'object' #self.yolo.names  # Load class names from YOLO
+        self.frame_step = 1  # Source frames between the previous processed frame and this one
+        self.source_index = 0  # Source frame position, used for time-based state when frames are sampled
+        self.motion_regions = []
+        self.flow_buffer = None
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
+        if self.zones is not None:
+            self.zones.reset()
+        self.reset_flow()
 
-        #print("Using CPU-based OpenCV for optical flow")
+    def reset_flow(self):
+        self.flow_engine.reset()
+        for engine in self.zone_flow_engines:
+            engine.reset()
+
+    def cut(self):
+        # The next frame is unrelated to the last one (a jump between time ranges): drop flow history and tracks
+        self.retire(np.ones(len(self.track_ids), dtype=bool))
+        self.prev_gray = None
+        self.prev_points = np.empty((0, 2), dtype=np.float32)
+        self.track_ids = np.empty(0, dtype=int)
+        self.track_boxes = np.empty((0, 4), dtype=np.float32)
+        self.track_misses = np.empty(0, dtype=int)
+        self.track_desc = self.track_desc[:0]
+        self.tracks = {}
+        self.last_detections = None
+        self.reset_flow()
+        if self.motion_gate is not None:
+            self.motion_gate.reset()
 
     def preprocess_frame(self, frame, target_size=(640, 640)):
         return cv2.resize(frame, target_size)
 
     def detect_objects(self, frame):
-        results = self.yolo(frame, conf=0.3, iou=0.5)
-        return results[0].boxes.xyxy.cpu().numpy() if len(results) > 0 else []
+        # Rows are x1, y1, x2, y2, conf, cls
+        if self.fast_detector is not None and self.fast_detector.supports(frame) and self.inference_size == 640:
+            return self.fast_detector(frame)
+        results = self.yolo(frame, conf=0.3, iou=0.5, imgsz=self.inference_size)
+        return self.boxes_to_array(results[0]) if len(results) > 0 else np.empty((0, 6), dtype=np.float32)
+
+    @staticmethod
+    def boxes_to_array(result):
+        boxes = result.boxes
+        return np.hstack([
+            boxes.xyxy.cpu().numpy(),
+            boxes.conf.cpu().numpy()[:, None],
+            boxes.cls.cpu().numpy()[:, None],
+        ]).astype(np.float32)
+
+    def detect(self, frame, source=None):
+        # Detections for a preprocessed frame plus the regions searched (None for the whole frame).
+        # source is the original frame, used for tiled detection at full resolution
+        source = frame if source is None else source
+        if self.tile_size and max(source.shape[:2]) > self.tile_size:
+            return self.detect_tiled(source, frame.shape[1::-1], self.zones.bounds if self.zones is not None else None)
+        if self.zones is not None:
+            return self.detect_zones(frame)
+        if self.motion_gate is not None:
+            return self.detect_regions(frame, self.motion_regions)
+        return self.detect_objects(frame), None
+
+    def detect_tiled(self, frame, target_size=(640, 640), regions=None):
+        # Batched detection over overlapping full-resolution tiles, merged and scaled to target_size.
+        # regions (target_size coordinates) restricts tiling to those boxes
+        h, w = frame.shape[:2]
+        sx, sy = w / target_size[0], h / target_size[1]
+        if regions is None:
+            areas = [(0, 0, w, h)]
+        else:
+            areas = [(int(x1 * sx), int(y1 * sy), min(w, int(np.ceil(x2 * sx))), min(h, int(np.ceil(y2 * sy))))
+                     for x1, y1, x2, y2 in regions]
+        tiles = [(ax + x1, ay + y1, ax + x2, ay + y2)
+                 for ax, ay, ax2, ay2 in areas
+                 for x1, y1, x2, y2 in tile_grid(ay2 - ay, ax2 - ax, self.tile_size, self.tile_overlap)]
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in tiles]
+
+        tile_detections = []
+        for i in range(0, len(crops), self.tile_batch):
+            results = self.yolo(crops[i:i + self.tile_batch], conf=0.3, iou=0.5, verbose=False)
+            tile_detections.extend(self.boxes_to_array(result) for result in results)
+
+        merged = merge_tile_detections(tile_detections, tiles, iou_threshold=0.5)
+        merged[:, [0, 2]] /= sx
+        merged[:, [1, 3]] /= sy
+        return merged, None if regions is None else list(regions)
+
+    def detect_zones(self, frame):
+        # Batched detection on each zone's bounding box; one full-frame pass when the boxes cover more than the frame
+        h, w = frame.shape[:2]
+        boxes = self.zones.bounds
+        if sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in boxes) >= w * h:
+            return self.detect_objects(frame), None
+        crops = [frame[y1:y2, x1:x2] for x1, y1, x2, y2 in boxes]
+        zone_detections = []
+        for i in range(0, len(crops), self.tile_batch):
+            results = self.yolo(crops[i:i + self.tile_batch], conf=0.3, iou=0.5, imgsz=self.inference_size, verbose=False)
+            zone_detections.extend(self.boxes_to_array(result) for result in results)
+        return merge_tile_detections(zone_detections, boxes, iou_threshold=0.5), list(boxes)
+
+    def detect_regions(self, frame, regions, pad=16, max_fraction=None):
+        # Run detection on the crop covering all regions and shift boxes back to frame coordinates.
+        # Also returns the searched crop, or None when the whole frame was searched
+        box = union_box(regions)
+        h, w = frame.shape[:2]
+        if box is None:
+            return self.detect_objects(frame), None
+        x1, y1 = max(0, box[0] - pad), max(0, box[1] - pad)
+        x2, y2 = min(w, box[2] + pad), min(h, box[3] + pad)
+        max_fraction = self.region_fraction if max_fraction is None else max_fraction
+        if (x2 - x1) * (y2 - y1) > max_fraction * w * h:
+            return self.detect_objects(frame), None
+
+        detections = self.detect_objects(frame[y1:y2, x1:x2])
+        if len(detections) > 0:
+            detections = np.array(detections, copy=True)
+            detections[:, [0, 2]] += x1
+            detections[:, [1, 3]] += y1
+        return detections, [(x1, y1, x2, y2)]
 
     def calculate_optical_flow(self, frame_gray):
         if self.prev_gray is None:
             self.prev_gray = frame_gray
             return None
 
-        flow = cv2.calcOpticalFlowFarneback(self.prev_gray, frame_gray, None, 0.5, 3, 15, 3, 5, 1.1, 0)
+        flow = self.compute_flow(self.flow_engine, self.prev_gray, frame_gray)
         self.prev_gray = frame_gray
         return flow
 
-    def update_tracks(self, detections, flow):
-        if len(detections) == 0:
-            #print("No detections found, skipping frame.")
-            return self.tracks  # Skip frame if no detections
-
-        if self.prev_points is None or len(self.prev_points) == 0:
-            # Initialize tracking points based on detections
-            self.prev_points = np.array([[(box[0] + box[2]) / 2, (box[1] + box[3]) / 2] for box in detections])
-            self.tracks = {tuple(point): self.track_id + i for i, point in enumerate(self.prev_points)}
-            self.track_id += len(self.prev_points)
-            return self.tracks
-
-        if flow is not None:
-            if flow.ndim == 3 and self.prev_points.ndim == 2 and len(self.prev_points) > 0:
-                h, w, _ = flow.shape
-                valid_points = (self.prev_points[:, 0] < w) & (self.prev_points[:, 1] < h)
-                valid_prev_points = self.prev_points[valid_points]
-                
-                if len(valid_prev_points) > 0:  # Ensure there are valid points to update
-                    new_points = valid_prev_points + flow[valid_prev_points[:, 1].astype(int), valid_prev_points[:, 0].astype(int), :]
-                    new_tracks = {}
-                    for old_point, new_point in zip(valid_prev_points, new_points):
-                        old_track_id = self.tracks.get(tuple(old_point))
-                        if old_track_id is not None:
-                            new_tracks[tuple(new_point)] = old_track_id
-                    self.tracks = new_tracks
-                    self.prev_points = valid_prev_points
-            else:
-                print("Flow or points dimensions are not as expected or no valid points.")
+    def compute_flow(self, engine, prev_gray, frame_gray):
+        if self.flow_scale < 1.0:
+            # Estimate at reduced resolution, then upsample and rescale the vectors to frame pixels
+            h, w = frame_gray.shape[:2]
+            size = (max(8, int(w * self.flow_scale)), max(8, int(h * self.flow_scale)))
+            small_flow = engine.compute(cv2.resize(prev_gray, size, interpolation=cv2.INTER_AREA),
+                                        cv2.resize(frame_gray, size, interpolation=cv2.INTER_AREA), self.frame_step)
+            flow = cv2.resize(small_flow, (w, h), interpolation=cv2.INTER_LINEAR)
+            flow[..., 0] *= w / size[0]
+            flow[..., 1] *= h / size[1]
+            return flow
+        return engine.compute(prev_gray, frame_gray, self.frame_step)
+
+    def calculate_zone_flow(self, frame_gray):
+        # Flow on each zone's bounding box only, embedded in a reused full-size field that stays zero elsewhere
+        if self.prev_gray is None:
+            self.prev_gray = frame_gray
+            return None
+        if self.flow_buffer is None or self.flow_buffer.shape[:2] != frame_gray.shape[:2]:
+            self.flow_buffer = np.zeros(frame_gray.shape[:2] + (2,), dtype=np.float32)
+        for (x1, y1, x2, y2), engine in zip(self.zones.bounds, self.zone_flow_engines):
+            self.flow_buffer[y1:y2, x1:x2] = self.compute_flow(engine, self.prev_gray[y1:y2, x1:x2], frame_gray[y1:y2, x1:x2])
+        self.prev_gray = frame_gray
+        return self.flow_buffer
+
+    def describe(self, frame, boxes):
+        # Appearance descriptors for boxes, zero-width when re-identification is off
+        if self.reid is None or frame is None:
+            return np.zeros((len(boxes), self.track_desc.shape[1]), dtype=np.float32)
+        return color_histograms(frame, boxes)
+
+    def retire(self, lost):
+        # Hand dropped tracks to the re-identification gallery
+        if self.reid is not None and lost.any():
+            self.reid.add(self.track_ids[lost], self.track_desc[lost], self.source_index)
+
+    def update_tracks(self, detections, flow, new_detections=True, frame=None, searched=None):
+        # Move every track with the flow, then match fresh detections (possibly none) on keyframes.
+        # Stale detections from an earlier keyframe are never used to create or correct tracks
+        if flow is not None and len(self.prev_points) > 0:
+            if flow.ndim != 3:
+                print("Flow dimensions are not as expected.")
                 return self.tracks
+            h, w, _ = flow.shape
+            valid_points = ((self.prev_points[:, 0] >= 0) & (self.prev_points[:, 0] < w) &
+                            (self.prev_points[:, 1] >= 0) & (self.prev_points[:, 1] < h))
+            self.retire(~valid_points)
+            valid_prev_points = self.prev_points[valid_points]
+            displacement = flow[valid_prev_points[:, 1].astype(int), valid_prev_points[:, 0].astype(int), :]
+            self.prev_points = valid_prev_points + displacement
+            self.track_ids = self.track_ids[valid_points]
+            self.track_boxes = self.track_boxes[valid_points] + np.tile(displacement, 2)
+            self.track_misses = self.track_misses[valid_points]
+            self.track_desc = self.track_desc[valid_points]
+
+        if new_detections:
+            boxes = np.asarray(detections, dtype=np.float32).reshape(-1, 6)[:, :4]
+            self.associate(boxes, frame, searched)
+
+        return self._publish_tracks()
+
+    @staticmethod
+    def boxes_inside(boxes, regions):
+        # Rows of boxes lying entirely within one of the regions
+        inside = np.zeros(len(boxes), dtype=bool)
+        for x1, y1, x2, y2 in regions:
+            inside |= (boxes[:, 0] >= x1) & (boxes[:, 1] >= y1) & (boxes[:, 2] <= x2) & (boxes[:, 3] <= y2)
+        return inside
+
+    def associate(self, boxes, frame=None, searched=None):
+        # Match fresh detections to tracks, comparing only pairs in neighbouring grid cells.
+        # searched limits misses to tracks the detector actually looked at; None means the whole frame
+        self.grid.update(self.track_ids, self.prev_points)
+        det_idx, pair_ids = self.grid.candidate_pairs(boxes)
+        descriptors = self.describe(frame, boxes)
+        row_of = {int(track_id): row for row, track_id in enumerate(self.track_ids)}
+        rows = np.array([row_of[track_id] for track_id in pair_ids], dtype=int)
+
+        matched_dets = np.zeros(len(boxes), dtype=bool)
+        matched_rows = np.zeros(len(self.track_ids), dtype=bool)
+        if len(rows) > 0:
+            iou = pairwise_iou(boxes[det_idx], self.track_boxes[rows])
+            for k in np.argsort(-iou):
+                if iou[k] < self.match_iou:
+                    break
+                d, r = det_idx[k], rows[k]
+                if matched_dets[d] or matched_rows[r]:
+                    continue
+                matched_dets[d] = matched_rows[r] = True
+                self.track_boxes[r] = boxes[d]
+                self.prev_points[r] = (boxes[d, :2] + boxes[d, 2:]) / 2
+                self.track_desc[r] = descriptors[d]
+
+        missed = ~matched_rows
+        if searched is not None:
+            missed &= self.boxes_inside(self.track_boxes, searched)
+        self.track_misses[matched_rows] = 0
+        self.track_misses[missed] += 1
+        keep = self.track_misses <= self.max_misses
+        self.retire(~keep)
+
+        new_boxes = boxes[~matched_dets]
+        new_desc = descriptors[~matched_dets]
+        self.prev_points = np.concatenate([self.prev_points[keep], (new_boxes[:, :2] + new_boxes[:, 2:]) / 2])
+        self.track_ids = np.concatenate([self.track_ids[keep], self.reidentify(new_desc)])
+        self.track_boxes = np.concatenate([self.track_boxes[keep], new_boxes])
+        self.track_misses = np.concatenate([self.track_misses[keep], np.zeros(len(new_boxes), dtype=int)])
+        self.track_desc = np.concatenate([self.track_desc[keep], new_desc])
+        self.grid.update(self.track_ids, self.prev_points)
+
+    def reidentify(self, descriptors):
+        # Ids for new tracks: recovered from the gallery where possible, fresh otherwise
+        ids = np.full(len(descriptors), -1, dtype=int)
+        if self.reid is not None:
+            ids = self.reid.match(descriptors, self.source_index)
+        fresh = ids < 0
+        ids[fresh] = np.arange(self.track_id, self.track_id + fresh.sum())
+        self.track_id += int(fresh.sum())
+        return ids
 
+    def _publish_tracks(self):
+        self.tracks = {tuple(point): int(track_id) for point, track_id in zip(self.prev_points, self.track_ids)}
         return self.tracks
 
-    def process_frame(self, frame, fps):
-        frame = self.preprocess_frame(frame)
-        frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        if self.frame_count % self.detection_interval == 0:
-            self.last_detections = self.detect_objects(frame)
-        
-        flow = self.calculate_optical_flow(frame_gray)
-        self.tracks = self.update_tracks(self.last_detections, flow)
-        
+    def process_frame(self, frame, fps, frame_gray=None, frame_step=1, detections=None, source_index=None, searched=None):
+        # A frame_gray argument means frame is already preprocessed, e.g. a read-only FrameCache slice.
+        # detections, when given, are this frame's keyframe detections computed elsewhere by detect(),
+        # with searched the regions it returned.
+        # source_index is the frame's absolute position in the source; without it positions are counted from 0
+        if source_index is not None:
+            self.source_index = source_index
+        elif self.frame_count > 0:
+            self.source_index += frame_step
+        self.frame_step = frame_step
+        source = frame
+        cached = frame_gray is not None
+        if not cached:
+            frame = self.preprocess_frame(frame)
+            frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        moving = True
+        if self.motion_gate is not None:
+            moving, self.motion_regions = self.motion_gate.update(frame_gray)
+
+        detected = False
+        if moving or self.last_detections is None:
+            if detections is not None:
+                self.last_detections = detections
+                self.searched_regions = searched
+                detected = True
+            elif self.trace_reader is not None:
+                detected = self.replay_detections()
+            elif self.yolo is not None and (self.frame_count % self.detection_interval == 0 or self.last_detections is None):
+                detected = True
+                self.last_detections, self.searched_regions = self.detect(frame, source)
+                if self.trace_writer is not None:
+                    self.trace_writer.write(self.source_index, time.time(), self.last_detections, self.searched_regions)
+            if self.last_detections is None:
+                self.last_detections = np.empty((0, 6), dtype=np.float32)
+
+            if self.zones is not None:
+                flow = self.calculate_zone_flow(frame_gray)
+            else:
+                flow = self.calculate_optical_flow(frame_gray)
+            self.tracks = self.update_tracks(self.last_detections, flow, detected, frame, self.searched_regions)
+        else:
+            # Nothing moved: carry tracks forward without detection or flow
+            flow = None
+            self.reset_flow()  # A warm start from before the pause would be stale
+            self.prev_gray = frame_gray
+
+        if self.zones is not None:
+            self.zones.update(self.tracks, self.source_index)
+
+        if cached:
+            frame = frame.copy()
         frame = self.visualize(frame, self.tracks, flow, fps)
         
         self.frame_count += 1
         return frame
 
+    def replay_detections(self):
+        # Detections come from the trace exactly on the frames where they were recorded
+        replayed = self.trace_reader.get(self.source_index)
+        if replayed is not None:
+            self.last_detections, self.searched_regions = replayed
+            return True
+        if self.last_detections is None:
+            self.last_detections = np.empty((0, 6), dtype=np.float32)
+        return False
+
+    def close(self):
+        if self.trace_writer is not None:
+            self.trace_writer.close()
+
     def visualize(self, frame, tracks, flow, fps):
         # Display Track IDs and Class Names on Detected Objects
         for detection in self.last_detections:
@@ -105,7 +413,7 @@ class OptimizedOpticalFlowTracker:
                                 (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
 
         # Draw Flow Lines (optional)
-        if flow is not None:
+        if flow is not None and self.draw_flow:
             step = 16
             h, w = flow.shape[:2]
             y, x = np.mgrid[step / 2:h:step, step / 2:w:step].reshape(2, -1).astype(int)
@@ -114,67 +422,217 @@ class OptimizedOpticalFlowTracker:
             lines = np.int32(lines + 0.5)
             cv2.polylines(frame, lines, 0, (0, 255, 255))
 
+        if self.zones is not None:
+            self.zones.draw(frame)
+
         # Display FPS count
         cv2.putText(frame, f"FPS: {fps:.2f}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
 
         return frame
 
-def main(input_source, output_file, max_frames=None):
-    tracker = OptimizedOpticalFlowTracker()
-    
-    if input_source == '0':
-        cap = cv2.VideoCapture(0)
-        print("Using webcam as input source")
+SEEK_THRESHOLD = 250  # Source frames; larger gaps are seeked rather than grabbed
+MAX_FLOW_GAP = 30  # Source frames; flow and tracks are not carried across larger jumps than this or the sampling step
+
+def build_tracker(motion_gate=None, tile_size=None, tile_overlap=0.2, zones_file=None, reid=False, fast_inference=False,
+                  flow_engine='farneback', record_detections=None, replay_detections=None, load_detector=True):
+    gate = MotionGate(method=motion_gate) if motion_gate else None
+    zones = load_zones(zones_file) if zones_file else None
+    return OptimizedOpticalFlowTracker(motion_gate=gate, tile_size=tile_size, tile_overlap=tile_overlap, zones=zones,
+                                       reid=reid, fast_inference=fast_inference, flow_engine=flow_engine,
+                                       record_detections=record_detections, replay_detections=replay_detections,
+                                       load_detector=load_detector)
+
+def process_source(tracker, input_source, output_file, max_frames=None, encoder='auto', preset='ultrafast', frame_cache=None,
+                   progress=None, sample_every=None, sample_fps=None, time_ranges=None, latency_target_ms=None):
+    """Run the tracker over one source and write the output video, returning the number of frames processed.
+
+    progress, if given, is called as progress(frames_done, total_frames) after every frame; total_frames is 0 when unknown.
+    sample_every, sample_fps and time_ranges (seconds) restrict processing to a subset of frames; skipped frames are
+    only grabbed, or seeked over for long gaps, and never decoded.
+    latency_target_ms enables a LatencyController that lowers quality when capture-to-output latency exceeds it.
+    """
+    if frame_cache and tracker.tile_size:
+        # Cached frames are already 640x640, which would leave nothing to tile
+        print("Warning: the frame cache holds 640x640 frames and cannot be used with tiled detection; decoding the source instead")
+        frame_cache = None
+    if frame_cache and input_source != '0':
+        cache = FrameCache.open(input_source, frame_cache)
+        print(f"Using cached frames for {input_source} from {cache.cache_dir}")
+        fps = int(cache.fps)
+        total_frames = len(cache)
+        cap = None
     else:
-        cap = cv2.VideoCapture(input_source)
-        print(f"Using video file: {input_source}")
+        if input_source == '0':
+            cap = cv2.VideoCapture(0)
+            print("Using webcam as input source")
+        else:
+            cap = cv2.VideoCapture(input_source)
+            print(f"Using video file: {input_source}")
 
-    if not cap.isOpened():
-        print(f"Error: Could not open input source: {input_source}")
-        return
+        if not cap.isOpened():
+            raise IOError(f"Could not open input source: {input_source}")
 
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = int(cap.get(cv2.CAP_PROP_FPS))
-    
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    out = cv2.VideoWriter(output_file, fourcc, fps, (640, 640))  # Note the output size
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = int(cap.get(cv2.CAP_PROP_FPS))
+        total_frames = max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+        cache = None
+
+    sampler = None
+    if sample_every or sample_fps or time_ranges:
+        sampler = FrameSampler(fps, sample_every, sample_fps, time_ranges)
+        if total_frames:
+            total_frames = sampler.count(total_frames)
+    if max_frames is not None and total_frames:
+        total_frames = min(total_frames, max_frames)
+    controller = None
+    if latency_target_ms:
+        controller = LatencyController(latency_target_ms)
+        controller.apply(tracker)
+
+    out_fps = max(1, fps // sampler.step) if sampler is not None else fps
+    max_gap = max(MAX_FLOW_GAP, sampler.step) if sampler is not None else MAX_FLOW_GAP
+    out = open_video_sink(output_file, out_fps, (640, 640), backend=encoder, preset=preset)  # Note the output size
 
     frame_count = 0
+    position = 0  # Index of the next source frame the capture would return
+    last_index = None
     start_time = time.time()
     try:
         while True:
-            ret, frame = cap.read()
-            if not ret:
+            index = sampler.next_index(position) if sampler is not None else position
+            if index is None:
                 break
+            if cache is not None:
+                if index >= len(cache):
+                    break
+                frame, frame_gray = cache[index]
+            else:
+                if index - position > SEEK_THRESHOLD:
+                    # Long gaps (between time ranges) seek to the nearest keyframe instead of grabbing
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+                    position = index
+                grabbed = True
+                while position < index and grabbed:
+                    grabbed = cap.grab()  # Advance without decoding into a BGR image
+                    position += 1
+                if not grabbed:
+                    break
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                frame_gray = None
+            captured_at = time.time()
+            position = index + 1
+            frame_step = index - last_index if last_index is not None else 1
+            last_index = index
+            if frame_step > max_gap:
+                tracker.cut()
             
             # Calculate FPS
             elapsed_time = time.time() - start_time
             current_fps = frame_count / elapsed_time if elapsed_time > 0 else 0
 
-            processed_frame = tracker.process_frame(frame, current_fps)
+            processed_frame = tracker.process_frame(frame, current_fps, frame_gray, frame_step, source_index=index)
             out.write(processed_frame)
+            if controller is not None:
+                controller.update(time.time() - captured_at, tracker)
 
             frame_count += 1
+            if progress is not None:
+                progress(frame_count, total_frames)
             #if frame_count % 30 == 0:
 
                 #print(f"Processed {frame_count} frames. FPS: {current_fps:.2f}")
 
             if max_frames is not None and frame_count >= max_frames:
                 break
+    finally:
+        if cap is not None:
+            cap.release()
+        out.release()
+        print(f"Video processing complete. Output saved as '{output_file}'")
+        if tracker.zones is not None:
+            for name, stats in tracker.zones.summary(fps).items():
+                print(f"Zone {name}: {stats}")
+        if controller is not None:
+            print(f"Latency (ms): {controller.stats()} at quality level {controller.level}")
+
+    return frame_count
+
+def main(input_source, output_file, max_frames=None, motion_gate=None, tile_size=None, tile_overlap=0.2, zones_file=None, encoder='auto', preset='ultrafast',
+         frame_cache=None, reid=False, sample_every=None, sample_fps=None, time_ranges=None, fast_inference=False,
+         flow_engine='farneback', record_detections=None, replay_detections=None, latency_target_ms=None, processes=None):
+    if processes:
+        # Multi-process mode: decoder, detector and tracking processes share frames through shared memory
+        from frame_bus import run_pipeline
+        unsupported = [flag for flag, value in (
+            ('--motion_gate', motion_gate), ('--tile_size', tile_size), ('--frame_cache', frame_cache),
+            ('--sample_every', sample_every), ('--sample_fps', sample_fps), ('--time_ranges', time_ranges),
+            ('--record_detections', record_detections), ('--replay_detections', replay_detections),
+            ('--latency_target_ms', latency_target_ms)) if value]
+        if unsupported:
+            print(f"Error: --processes cannot be combined with {', '.join(unsupported)}")
+            return
+        tracker_kwargs = {'zones_file': zones_file, 'reid': reid, 'fast_inference': fast_inference,
+                          'flow_engine': flow_engine}
+        try:
+            run_pipeline(input_source, output_file, detectors=processes, max_frames=max_frames,
+                         tracker_kwargs=tracker_kwargs, sink_kwargs={'backend': encoder, 'preset': preset})
+        except IOError as e:
+            print(f"Error: {e}")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        return
 
+    tracker = build_tracker(motion_gate, tile_size, tile_overlap, zones_file, reid, fast_inference, flow_engine,
+                            record_detections, replay_detections)
+    
+    try:
+        process_source(tracker, input_source, output_file, max_frames, encoder, preset, frame_cache,
+                       sample_every=sample_every, sample_fps=sample_fps, time_ranges=time_ranges,
+                       latency_target_ms=latency_target_ms)
+    except IOError as e:
+        print(f"Error: {e}")
     except Exception as e:
         print(f"An error occurred: {e}")
     finally:
-        cap.release()
-        out.release()
-        print(f"Video processing complete. Output saved as '{output_file}'")
+        tracker.close()
+
+def add_tracker_arguments(parser):
+    parser.add_argument("--max_frames", type=int, default=None, help="Maximum number of frames to process")
+    parser.add_argument("--motion_gate", choices=["diff", "mog2"], default=None, help="Skip detection and flow on frames without motion")
+    parser.add_argument("--tile_size", type=int, default=None, help="Detect on overlapping tiles of this size for high-resolution inputs")
+    parser.add_argument("--tile_overlap", type=float, default=0.2, help="Fractional overlap between detection tiles")
+    parser.add_argument("--zones", default=None, help="JSON file of polygon zones to restrict processing to and count")
+    parser.add_argument("--encoder", choices=["auto", "ffmpeg", "opencv"], default="auto", help="Video encoder backend for the output file")
+    parser.add_argument("--preset", default="ultrafast", help="x264 preset used by the ffmpeg encoder")
+    parser.add_argument("--frame_cache", default=None, help="Directory for a decode-once memory-mapped frame cache (video files only)")
+    parser.add_argument("--reid", action="store_true", help="Re-identify lost tracks by appearance instead of assigning new IDs")
+    parser.add_argument("--fast_inference", action="store_true", help="Run YOLO directly through torch on full frames, bypassing the ultralytics predictor")
+    parser.add_argument("--flow", choices=sorted(FLOW_ENGINES), default="farneback", help="Dense optical flow engine")
+    parser.add_argument("--sample_every", type=int, default=None, help="Process only every k-th frame, skipping the rest without decoding")
+    parser.add_argument("--sample_fps", type=float, default=None, help="Process frames at roughly this rate, skipping the rest without decoding")
+    parser.add_argument("--time_ranges", type=parse_time_ranges, default=None, help="Only process these time ranges in seconds, e.g. '10-20,65-90'")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        import batch
+        batch.cli(sys.argv[2:])
+        sys.exit(0)
+
     parser = argparse.ArgumentParser(description="Optimized Optical Flow Tracker")
     parser.add_argument("--input", default="0", help="Input source. Use '0' for webcam or provide a path to a video file.")
     parser.add_argument("--output", default="output_video.mp4", help="Output video file name")
-    parser.add_argument("--max_frames", type=int, default=None, help="Maximum number of frames to process")
+    add_tracker_arguments(parser)
+    parser.add_argument("--record_detections", default=None, help="Write every keyframe's detections to this trace file")
+    parser.add_argument("--replay_detections", default=None, help="Replay detections from a trace file instead of running YOLO")
+    parser.add_argument("--latency_target_ms", type=float, default=None, help="Adapt quality to keep p95 capture-to-output latency under this target")
+    parser.add_argument("--processes", type=int, default=None, help="Run as a multi-process pipeline with this many detector processes")
     args = parser.parse_args()
 
-    main(args.input, args.output, args.max_frames)
+    main(args.input, args.output, args.max_frames, args.motion_gate, args.tile_size, args.tile_overlap, args.zones,
+         args.encoder, args.preset, args.frame_cache, args.reid, args.sample_every, args.sample_fps, args.time_ranges,
+         args.fast_inference, args.flow, args.record_detections, args.replay_detections,
+         args.latency_target_ms, args.processes)
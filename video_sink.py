@@ -0,0 +1,93 @@
+import logging
+import queue
+import shutil
+import subprocess
+import threading
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+class OpenCVVideoSink:
+    """Synchronous cv2.VideoWriter output, kept as the fallback sink."""
+
+    def __init__(self, output_path, fps, frame_size, fourcc='mp4v'):
+        self.output_path = output_path
+        self.writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, frame_size)
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def release(self):
+        self.writer.release()
+
+
+class FFmpegVideoSink:
+    """Pipes raw BGR frames to an ffmpeg x264 encoder from a background thread.
+
+    The caller only pays for a queue put; encoding happens in the ffmpeg
+    process and the output is yuv420p with faststart so browsers can play it.
+    """
+
+    def __init__(self, output_path, fps, frame_size, preset='ultrafast', crf=23, queue_size=64, ffmpeg='ffmpeg'):
+        self.output_path = output_path
+        width, height = frame_size
+        command = [
+            ffmpeg, '-loglevel', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{width}x{height}', '-r', str(fps or 30), '-i', '-',
+            '-an', '-c:v', 'libx264', '-preset', preset, '-crf', str(crf),
+            '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+            output_path,
+        ]
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        self.frames = queue.Queue(maxsize=queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                self.process.stdin.write(frame.tobytes())
+            except (BrokenPipeError, OSError) as e:
+                self.error = e
+                logger.error(f"ffmpeg writer failed: {str(e)}")
+
+    def write(self, frame):
+        if self.error is not None:
+            raise RuntimeError(f"ffmpeg writer failed: {self.error}")
+        self.frames.put(frame)
+
+    def release(self):
+        self.frames.put(None)
+        self.thread.join()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        returncode = self.process.wait()
+        # A failed encode leaves a missing or truncated file, so callers must not treat it as done
+        if self.error is not None:
+            raise RuntimeError(f"ffmpeg writer failed: {self.error}")
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg exited with code {returncode} while writing {self.output_path}")
+
+
+def open_video_sink(output_path, fps, frame_size, backend='auto', preset='ultrafast', crf=23):
+    """Open an ffmpeg sink when ffmpeg is available, otherwise fall back to OpenCV."""
+    if backend in ('auto', 'ffmpeg'):
+        ffmpeg = shutil.which('ffmpeg')
+        if ffmpeg is not None:
+            return FFmpegVideoSink(output_path, fps, frame_size, preset=preset, crf=crf, ffmpeg=ffmpeg)
+        if backend == 'ffmpeg':
+            raise RuntimeError("ffmpeg not found on PATH")
+        logger.info("ffmpeg not found, falling back to OpenCV video writer")
+    elif backend != 'opencv':
+        raise ValueError(f"Unknown video sink backend: {backend}")
+    return OpenCVVideoSink(output_path, fps, frame_size)
@@ -0,0 +1,106 @@
+import json
+
+import cv2
+import numpy as np
+
+
+def load_zones(path):
+    """Load polygon zones from a JSON file mapping zone name to [[x, y], ...] in processed-frame pixels."""
+    with open(path) as f:
+        return {name: np.asarray(points, dtype=np.int32) for name, points in json.load(f).items()}
+
+
+class ZoneAnalytics:
+    """Incremental per-zone occupancy, entry/exit counts and dwell times.
+
+    Zone polygons are rasterised once into boolean masks, so each frame only
+    needs a fancy-indexed lookup of the track points instead of polygon tests.
+    """
+
+    def __init__(self, zones, frame_size=(640, 640)):
+        w, h = frame_size
+        self.names = list(zones)
+        self.masks = np.zeros((len(self.names), h, w), dtype=bool)
+        for i, name in enumerate(self.names):
+            mask = np.zeros((h, w), dtype=np.uint8)
+            cv2.fillPoly(mask, [np.asarray(zones[name], dtype=np.int32)], 1)
+            self.masks[i] = mask.astype(bool)
+        self.polygons = [np.asarray(zones[name], dtype=np.int32) for name in self.names]
+
+        boxes = [cv2.boundingRect(polygon) for polygon in self.polygons]
+        self.bounds = [(x, y, min(w, x + bw), min(h, y + bh)) for x, y, bw, bh in boxes]
+
+        self.reset()
+
+    def reset(self):
+        zone_count = len(self.names)
+        self.occupancy = np.zeros(zone_count, dtype=int)
+        self.entries = np.zeros(zone_count, dtype=int)
+        self.exits = np.zeros(zone_count, dtype=int)
+        self.dwell_total = np.zeros(zone_count, dtype=np.int64)  # Frames spent by tracks that have left
+        self.dwell_count = np.zeros(zone_count, dtype=int)
+        self.entered_at = {}  # track_id -> frame index of entry per zone, -1 when outside
+
+    def update(self, tracks, frame_index):
+        zone_count, h, w = self.masks.shape
+        outside = np.full(zone_count, -1, dtype=np.int64)
+
+        if tracks:
+            points = np.array(list(tracks.keys()), dtype=np.float32).reshape(-1, 2)
+            ids = list(tracks.values())
+            xs = np.clip(points[:, 0].astype(int), 0, w - 1)
+            ys = np.clip(points[:, 1].astype(int), 0, h - 1)
+            inside = self.masks[:, ys, xs].T  # (tracks, zones)
+        else:
+            ids = []
+            inside = np.zeros((0, zone_count), dtype=bool)
+
+        previous = np.array([self.entered_at.get(track_id, outside) for track_id in ids], dtype=np.int64).reshape(-1, zone_count)
+        was_inside = previous >= 0
+        entered = inside & ~was_inside
+        exited = was_inside & ~inside
+
+        self.entries += entered.sum(axis=0)
+        self.exits += exited.sum(axis=0)
+        self.dwell_total += np.where(exited, frame_index - previous, 0).sum(axis=0)
+        self.dwell_count += exited.sum(axis=0)
+
+        current = np.where(entered, frame_index, np.where(inside, previous, -1))
+        seen = set(ids)
+        for track_id, entered_at in list(self.entered_at.items()):
+            if track_id not in seen:
+                # Track vanished: close any open visits
+                gone = entered_at >= 0
+                self.exits += gone
+                self.dwell_total += np.where(gone, frame_index - entered_at, 0)
+                self.dwell_count += gone
+                del self.entered_at[track_id]
+        for track_id, row in zip(ids, current):
+            if (row >= 0).any():
+                self.entered_at[track_id] = row
+            else:
+                self.entered_at.pop(track_id, None)
+
+        self.occupancy = inside.sum(axis=0)
+        return self.occupancy
+
+    def summary(self, fps=None):
+        """Per-zone counts; dwell times in seconds when fps is given, otherwise in frames."""
+        scale = 1.0 / fps if fps else 1.0
+        stats = {}
+        for i, name in enumerate(self.names):
+            mean_dwell = self.dwell_total[i] / self.dwell_count[i] if self.dwell_count[i] else 0.0
+            stats[name] = {
+                'occupancy': int(self.occupancy[i]),
+                'entries': int(self.entries[i]),
+                'exits': int(self.exits[i]),
+                'mean_dwell': float(mean_dwell * scale),
+            }
+        return stats
+
+    def draw(self, frame):
+        for name, polygon, count in zip(self.names, self.polygons, self.occupancy):
+            cv2.polylines(frame, [polygon], True, (255, 0, 255), 2)
+            x, y = polygon[0]
+            cv2.putText(frame, f"{name}: {count}", (int(x), int(y) - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 0, 255), 2)
+        return frame